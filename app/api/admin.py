@@ -0,0 +1,78 @@
+import base64
+import csv
+import io
+from typing import Literal
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app import async_crud, models, exceptions, dependencies
+from app.dependencies import SessionDep
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+EXPORT_FIELDS = list(models.UserResponse.model_fields)
+
+# Cursors are opaque to clients, they only wrap the last user id of a page
+def encode_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(str(user_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded).decode())
+    except ValueError:
+        raise exceptions.InvalidCursor()
+
+@router.get("/users", response_model=models.UserPage)
+async def list_users(
+    admin: dependencies.AdminUser,
+    session: SessionDep,
+    cursor: str | None = None,
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    """List users page by page"""
+
+    after_id = decode_cursor(cursor) if cursor else None
+    users = await async_crud.get_users_page(session, after_id, limit)
+
+    next_cursor = encode_cursor(users[-1].id) if len(users) == limit else None
+    return models.UserPage(items=users, next_cursor=next_cursor)
+
+@router.get("/users/export")
+async def export_users(
+    admin: dependencies.AdminUser,
+    session: SessionDep,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    batch_size: int = Query(default=1000, ge=1, le=10000)
+):
+    """Stream every user as NDJSON or CSV"""
+
+    async def ndjson_rows():
+        async for users in async_crud.iter_users(session, batch_size):
+            yield "".join(
+                models.UserResponse.model_validate(user).model_dump_json() + "\n" for user in users
+            )
+
+    async def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+        async for users in async_crud.iter_users(session, batch_size):
+            for user in users:
+                writer.writerow(models.UserResponse.model_validate(user).model_dump())
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        # Header only when there are no users
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    if format == "csv":
+        return StreamingResponse(
+            csv_rows(),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=users.csv"}
+        )
+    return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
@@ -1,49 +1,150 @@
 from typing import Annotated
 from datetime import timedelta
 import logging
-from fastapi import APIRouter, Depends, status, BackgroundTasks
+import time
+from fastapi import APIRouter, Depends, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app import crud, models, email, security
-from app.dependencies import SessionDep
+from app import async_crud, exceptions, models, security, throttle
+from app.cache import introspection_cache, recently_written
+from app.database import pin_primary
+from app.dependencies import IntrospectionClient, SessionDep, credentials_exception, oauth2_scheme
+from app.revocation import revocations
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+def client_ip(request: Request) -> str | None:
+    return request.client.host if request.client else None
+
 @router.post("/register", 
           response_model=models.UserResponse, 
           status_code=status.HTTP_201_CREATED)
 async def register(
     user: models.UserCreate,
-    session: SessionDep,
-    bg_tasks: BackgroundTasks
+    request: Request,
+    session: SessionDep
 ):
     """Register a new account"""
+
+    await throttle.register.attempt(client_ip(request))
     
-    new_user = crud.create_user(session, user)
-    
-    bg_tasks.add_task(email.send_verification_email, new_user, new_user.verification_token)
+    # The verification email is queued in the outbox with the new account
+    new_user = await async_crud.create_user(session, user)
     
     return new_user
 
 @router.post("/login", response_model=models.Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    request: Request,
     session: SessionDep
 ) -> models.Token:
     """Log in and receive JWT tokens"""
 
-    # Authenticate user
-    user = crud.authenticate_user(session, form_data.username, form_data.password)
+    # Counted (or rejected) before the password is hashed
+    ip = client_ip(request)
+    counted_at = await throttle.login_attempt(ip, form_data.username)
+
+    # Authenticate user, a failure keeps its attempt counted
+    user = await async_crud.authenticate_user(session, form_data.username, form_data.password)
+    await throttle.login_succeeded(ip, form_data.username, counted_at)
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.username},
+        data=security.user_claims(user),
         expires_delta=access_token_expires
     )
-    return models.Token(access_token=access_token, token_type="bearer")
+    refresh_token = await async_crud.create_refresh_token(session, user.id)
+    return models.Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+@router.post("/refresh", response_model=models.Token)
+async def refresh_access_token(
+    request: models.RefreshRequest,
+    session: SessionDep
+) -> models.Token:
+    """Exchange a refresh token for new access and refresh tokens"""
+
+    user, refresh_token = await async_crud.rotate_refresh_token(session, request.refresh_token)
+
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = security.create_access_token(
+        data=security.user_claims(user),
+        expires_delta=access_token_expires
+    )
+    return models.Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    session: SessionDep,
+    request: models.LogoutRequest | None = None
+):
+    """Revoke the access token (and the refresh token, if given) before they expire"""
+
+    token_data = security.verify_token(token)
+    if token_data is None:
+        raise credentials_exception
+    if token_data.jti is None or token_data.expires_at is None:
+        # Issued before tokens had an id, it can only expire
+        raise exceptions.InvalidToken("This token cannot be revoked, it stays valid until it expires")
+
+    await async_crud.revoke_access_token(session, token_data, request.refresh_token if request else None)
+    # Effective at once on this worker, the others pick it up at their next sync
+    revocations.add(token_data.jti, token_data.expires_at)
+
+@router.post("/introspect", response_model=models.IntrospectResponse)
+async def introspect(
+    request: models.IntrospectRequest,
+    session: SessionDep,
+    client: IntrospectionClient
+) -> models.IntrospectResponse:
+    """Check a batch of access tokens at once (for gateways), with one user query per batch"""
+
+    now = time.time()
+    results: dict[str, models.TokenIntrospection] = {}
+    pending: dict[str, dict] = {}
+
+    for token in dict.fromkeys(request.tokens):
+        # Cached results still have to be unexpired and not revoked since
+        cached = introspection_cache.get(security.hash_token(token))
+        if cached is not None:
+            exp, jti, result = cached
+            if exp > now and not (jti and revocations.is_revoked(jti)):
+                results[token] = result
+                continue
+
+        claims = security.verify_claims(token)
+        if claims is None or claims.get("uid") is None:
+            results[token] = models.TokenIntrospection(active=False)
+        else:
+            pending[token] = claims
+
+    if pending:
+        user_ids = {claims["uid"] for claims in pending.values()}
+        if any(recently_written.get(user_id) for user_id in user_ids):
+            pin_primary(session)
+        users = {user.id: user for user in await async_crud.get_users_by_ids(session, list(user_ids))}
+
+        for token, claims in pending.items():
+            user = users.get(claims["uid"])
+            # A password or identity change bumps the token version (older tokens have no tv claim)
+            if user is None or not user.is_active or claims.get("tv", user.token_version) != user.token_version:
+                results[token] = models.TokenIntrospection(active=False)
+            else:
+                results[token] = models.TokenIntrospection(
+                    active=True,
+                    username=user.username,
+                    user_id=user.id,
+                    verified=user.is_verified,
+                    exp=claims["exp"],
+                    claims=claims
+                )
+            introspection_cache.set(security.hash_token(token), (claims["exp"], claims.get("jti"), results[token]))
+
+    return models.IntrospectResponse(results=[results[token] for token in request.tokens])
 
 @router.get("/verify-email")
 async def verify_email(
@@ -52,32 +153,35 @@ async def verify_email(
 ):
     """Email verification and login"""
 
-    user = crud.verify_email_token(session, token)
+    user = await async_crud.verify_email_token(session, token)
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.username},
+        data=security.user_claims(user),
         expires_delta=access_token_expires
     )
 
+    refresh_token = await async_crud.create_refresh_token(session, user.id)
+
     return models.Token(
         access_token=access_token,
         token_type="bearer",
+        refresh_token=refresh_token,
         message="Email verified and logged in successfully!"
     )
 
 @router.post("/forgot-password")
 async def forgot_password(
     user_email: str,
-    session: SessionDep,
-    bg_task: BackgroundTasks
+    request: Request,
+    session: SessionDep
 ):
     """Send a password reset email"""
 
+    await throttle.forgot_password.attempt(client_ip(request), user_email)
+
     try:
-        reset_token = crud.create_password_reset_token(session, user_email)
-        user = crud.get_user_by_email(session, user_email)
-        bg_task.add_task(email.send_password_reset_email, user, reset_token)
+        await async_crud.create_password_reset_token(session, user_email)
     except Exception as e:
         logger.error(f"Error sending password reset email: {e}")
     
@@ -92,16 +196,19 @@ async def reset_password(
 ):
     """Reset password with token and login"""
 
-    user = crud.reset_password(session, request.token, request.new_password)
+    user = await async_crud.reset_password(session, request.token, request.new_password)
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.username},
+        data=security.user_claims(user),
         expires_delta=access_token_expires
     )
 
+    refresh_token = await async_crud.create_refresh_token(session, user.id)
+
     return models.Token(
         access_token=access_token,
         token_type="bearer",
+        refresh_token=refresh_token,
         message="Password reset successfully. You are now logged in"
     )
\ No newline at end of file
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+
+from app.keys import keyring
+
+router = APIRouter(tags=["Keys"])
+
+@router.get("/.well-known/jwks.json")
+async def read_jwks(response: Response):
+    """Public keys for verifying access tokens, empty when tokens are signed with HS256"""
+
+    # Consumers may cache the set, new keys only sign after JWT_KEY_ACTIVATION_SECONDS
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return keyring.jwks() if keyring is not None else {"keys": []}
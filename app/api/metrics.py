@@ -0,0 +1,76 @@
+import ipaddress
+import sys
+
+from fastapi import APIRouter, Depends, Request, Response
+from sqlmodel import Session
+
+from app import crud, database, exceptions, hashing
+from app.cache import user_cache, token_version_cache
+from app.config import settings
+from app.revocation import revocations
+from app.metrics import registry
+
+router = APIRouter(tags=["Metrics"])
+
+@registry.gauge("db_pool_connections", "Database pool connections by pool and state", ("pool", "state"))
+def pool_connections():
+    pools = {"main": database.async_engine or database.engine}
+    for i, engine in enumerate(database.async_read_engines or database.read_engines):
+        pools[f"read{i}"] = engine
+    values = {}
+    for name, engine in pools.items():
+        pool = engine.pool if engine is not None else None
+        if hasattr(pool, "checkedout"):
+            values.update({
+                (name, "checked_out"): pool.checkedout(),
+                (name, "idle"): pool.checkedin(),
+                (name, "overflow"): max(pool.overflow(), 0),
+                (name, "size"): pool.size(),
+            })
+    return values or None
+
+@registry.gauge("hashing_pending", "Password hashing jobs queued or running")
+def hashing_pending():
+    return hashing.executor.pending
+
+@registry.gauge("mail_queue_depth", "Emails waiting in this process's SMTP dispatcher")
+def mail_queue_depth():
+    # Only loaded by processes that send mail
+    email = sys.modules.get("app.email")
+    return email.dispatcher.queue_depth if email else None
+
+@registry.gauge("email_outbox_depth", "Emails waiting in the outbox table")
+def email_outbox_depth():
+    # Through the sync engine, the endpoint runs in the threadpool
+    if database.engine is None:
+        return None
+    with Session(database.engine) as session:
+        return crud.count_outbox(session)
+
+@registry.gauge("cache_entries", "Entries in the in-process caches", ("cache",))
+def cache_entries():
+    return {"user": len(user_cache), "token_version": len(token_version_cache), "revoked_tokens": len(revocations)}
+
+@registry.gauge("cache_lookups_total", "Cache lookups by result", ("cache", "result"), kind="counter")
+def cache_lookups():
+    return {
+        ("user", "hit"): user_cache.hits, ("user", "miss"): user_cache.misses,
+        ("token_version", "hit"): token_version_cache.hits, ("token_version", "miss"): token_version_cache.misses,
+    }
+
+def allowed_scraper(request: Request):
+    """Only clients in METRICS_ALLOWED_IPS: the metrics show load, pools and queues"""
+
+    try:
+        address = ipaddress.ip_address(request.client.host) if request.client else None
+    except ValueError:
+        address = None
+    networks = (ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+    if address is None or not any(address in network for network in networks):
+        raise exceptions.NotEnoughPermissions()
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(allowed_scraper)])
+def read_metrics():
+    """Metrics in the Prometheus text exposition format"""
+
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
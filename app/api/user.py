@@ -1,53 +1,71 @@
-from fastapi import APIRouter, BackgroundTasks
+from typing import Annotated
+from fastapi import APIRouter, Header, Response, status
 
-from app import crud, models, email, dependencies
+from app import async_crud, crud, models, dependencies
 from app.dependencies import SessionDep
 from app.config import settings
 
 router = APIRouter(prefix="/user", tags=["User"])
 
-@router.get("/me", response_model=models.UserResponse)
+# Clients may keep the profile but must revalidate it (If-None-Match) before use
+CACHE_CONTROL = "private, no-cache"
+
+def etag_list(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+@router.get("/me", response_model=models.UserResponse, responses={304: {"description": "Not modified"}})
 async def read_user_me(
-    current_user: dependencies.CurrentUser
+    current_user: dependencies.CurrentUser,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None
 ):
     """Retrieve current user infomation"""
 
+    etag = crud.user_etag(current_user)
+    # Weak comparison: a W/ prefix does not matter here
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.removeprefix("W/") for tag in etag_list(if_none_match)]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
     return current_user
 
-@router.patch("/me", response_model=models.UserResponse)
+@router.patch("/me", response_model=models.UserResponse, responses={412: {"description": "If-Match does not match"}})
 async def update_user_me(
     user_update: models.UserUpdate,
-    current_user: dependencies.CurrentUser,
-    session: SessionDep
+    principal: dependencies.CurrentPrincipal,
+    session: SessionDep,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None
 ):
-    """Update user information"""
+    """Update user information, with If-Match only if nobody changed it since it was read"""
 
-    update_user = crud.update_user(session, current_user.id, user_update)
+    # "*" matches any current version of an existing resource
+    expected = etag_list(if_match) if if_match and if_match.strip() != "*" else None
+    update_user = await async_crud.update_user(session, principal.user_id, user_update, expected)
 
+    response.headers["ETag"] = crud.user_etag(update_user)
     return update_user
 
 @router.post("/change-password")
 async def change_password(
     request: models.ChangePasswordRequest,
-    current_user: dependencies.CurrentUser,
+    principal: dependencies.CurrentPrincipal,
     session: SessionDep
 ):
     """Change password"""
 
-    user = crud.change_password(session, current_user.id, request.current_password, request.new_password)
+    user = await async_crud.change_password(session, principal.user_id, request.current_password, request.new_password)
 
     return {"message": "Paswword changed successfully"}
 
 @router.post("/resend-verification")
 async def resend_verification(
-    current_user: dependencies.CurrentUser,
-    session: SessionDep,
-    bg_task: BackgroundTasks
+    principal: dependencies.CurrentPrincipal,
+    session: SessionDep
 ):
     """Resend verification email"""
 
-    new_token = crud.regenerate_verification_token(session, current_user)
-
-    bg_task.add_task(email.send_verification_email, current_user, new_token)
+    await async_crud.regenerate_verification_token(session, principal.user_id)
 
     return {"message": "Verification email sent"}
\ No newline at end of file
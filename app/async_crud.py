@@ -0,0 +1,88 @@
+"""Async versions of the functions in app.crud.
+
+Every function accepts either a Session or an AsyncSession, so the routers work
+the same in both database modes. With an AsyncSession the sync crud function runs
+through ``AsyncSession.run_sync`` and its SQL no longer blocks the event loop.
+"""
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, models
+from app.database import REPLICA_READ, run_sync
+
+# Already async in app.crud
+from app.crud import create_user, authenticate_user, reset_password, change_password
+
+# User READ operations
+async def get_user(session: Session | AsyncSession, user_id: int):
+    return await run_sync(session, crud.get_user, user_id)
+
+async def get_users_by_ids(session: Session | AsyncSession, user_ids: list[int]) -> list[models.UserDB]:
+    return await run_sync(session, crud.get_users_by_ids, user_ids)
+
+async def get_token_version(session: Session | AsyncSession, user_id: int) -> int | None:
+    return await run_sync(session, crud.get_token_version, user_id)
+
+async def get_user_by_email(session: Session | AsyncSession, email: str):
+    return await run_sync(session, crud.get_user_by_email, email)
+
+async def get_user_by_username(session: Session | AsyncSession, username: str):
+    return await run_sync(session, crud.get_user_by_username, username)
+
+async def get_user_by_username_or_email(session: Session | AsyncSession, username_or_email: str):
+    return await run_sync(session, crud.get_user_by_username_or_email, username_or_email)
+
+async def get_user_by_reset_token(session: Session | AsyncSession, token: str):
+    return await run_sync(session, crud.get_user_by_reset_token, token)
+
+async def attach_user(session: Session | AsyncSession, user: models.UserDB):
+    return await run_sync(session, crud.attach_user, user)
+
+async def get_users(session: Session | AsyncSession, skip: int = 0, limit: int = 100) -> list[models.UserDB]:
+    return await run_sync(session, crud.get_users, skip, limit)
+
+async def get_users_page(session: Session | AsyncSession, after_id: int | None = None, limit: int = 100) -> list[models.UserDB]:
+    return await run_sync(session, crud.get_users_page, after_id, limit)
+
+async def iter_users(session: Session | AsyncSession, batch_size: int = 1000):
+    if not isinstance(session, AsyncSession):
+        for partition in crud.iter_users(session, batch_size):
+            yield partition
+        return
+
+    result = await session.stream_scalars(crud.select_users_for_export(batch_size), bind_arguments=REPLICA_READ)
+    async for partition in result.partitions():
+        yield partition
+
+# User WRITE operations
+async def save_user(session: Session | AsyncSession, user: models.UserDB):
+    return await run_sync(session, crud.save_user, user)
+
+async def update_user(session: Session | AsyncSession, user_id: int, user_update: models.UserUpdate, if_match: list[str] | None = None):
+    return await run_sync(session, crud.update_user, user_id, user_update, if_match)
+
+async def delete_user(session: Session | AsyncSession, user_id: int):
+    return await run_sync(session, crud.delete_user, user_id)
+
+# Auth and Token operations
+async def verify_email_token(session: Session | AsyncSession, token: str):
+    return await run_sync(session, crud.verify_email_token, token)
+
+async def regenerate_verification_token(session: Session | AsyncSession, user_id: int):
+    return await run_sync(session, crud.regenerate_verification_token, user_id)
+
+async def create_password_reset_token(session: Session | AsyncSession, email: str) -> tuple[models.UserDB, str]:
+    return await run_sync(session, crud.create_password_reset_token, email)
+
+async def create_refresh_token(session: Session | AsyncSession, user_id: int, family_id: str | None = None) -> str:
+    return await run_sync(session, crud.create_refresh_token, user_id, family_id)
+
+async def rotate_refresh_token(session: Session | AsyncSession, token: str) -> tuple[models.UserDB, str]:
+    return await run_sync(session, crud.rotate_refresh_token, token)
+
+async def revoke_access_token(session: Session | AsyncSession, token_data: models.TokenData, refresh_token: str | None = None):
+    return await run_sync(session, crud.revoke_access_token, token_data, refresh_token)
+
+async def consume_reset_token(session: Session | AsyncSession, user_id: int, token: str, hashed_password: str):
+    return await run_sync(session, crud.consume_reset_token, user_id, token, hashed_password)
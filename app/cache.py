@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.config import settings
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire ``ttl`` seconds after being set"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+# Authenticated principals loaded by dependencies.get_current_user, keyed by token subject
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+# Users written by this process recently, read from the primary until replicas catch up
+recently_written = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.DATABASE_REPLICA_PIN_SECONDS)
+
+def invalidate_user(*subjects: str | None):
+    """Drop cached principals for the given usernames / emails"""
+
+    subjects = [s for s in subjects if s]
+    user_cache.delete(*subjects)
+    if settings.DATABASE_REPLICA_URLS:
+        for subject in subjects:
+            recently_written.set(subject, True)
+
+# POST /auth/introspect results of signature checked tokens, keyed by token digest
+introspection_cache = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.INTROSPECT_CACHE_TTL_SECONDS)
+
+# Current token_version per user id, checked by stateless token authorisation
+token_version_cache = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.TOKEN_VERSION_CACHE_TTL_SECONDS)
+
+def invalidate_token_version(user_id: int):
+    token_version_cache.delete(user_id)
+    if settings.DATABASE_REPLICA_URLS:
+        recently_written.set(user_id, True)
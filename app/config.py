@@ -3,11 +3,94 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./test.db"
+    # Read replicas (JSON list, cùng driver với DATABASE_URL)
+    DATABASE_REPLICA_URLS: list[str] = []
+    # After a user is written, this process reads that user from the primary for this long
+    DATABASE_REPLICA_PIN_SECONDS: int = 5
+
+    # Connection pool (database server, và các connection đọc của SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_PRE_PING: bool = False
+
+    # SQLite profile, áp dụng cho mỗi connection (để trống / 0 = mặc định của SQLite)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_CACHE_SIZE: int = -65536
+    # One writer connection per process, reads from a read-only pool
+    SQLITE_SINGLE_WRITER: bool = True
+
+    # Chạy migration khi khởi động nếu schema cũ (serve.py chạy một lần rồi tắt trong các worker)
+    MIGRATE_ON_STARTUP: bool = True
+
+    # Production server (serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int | None = None
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
 
     # JWT
     SECRET_KEY: str = "super-secret-key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+
+    # Access tokens revoked by logout: each worker reloads the list this often
+    REVOCATION_SYNC_SECONDS: float = 5.0
+    # Bloom filter sizing (số token bị thu hồi dự kiến, tỉ lệ false positive)
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+
+    # POST /auth/introspect: số token tối đa mỗi request, và thời gian cache kết quả
+    INTROSPECT_MAX_TOKENS: int = 100
+    INTROSPECT_CACHE_TTL_SECONDS: int = 10
+    # client_id -> secret được gọi introspect (HTTP Basic), để trống thì từ chối mọi request
+    INTROSPECT_CLIENTS: dict[str, str] = {}
+    # RS256/EdDSA: thư mục chứa các key <kid>.pem, để trống thì ký HS256 bằng SECRET_KEY
+    JWT_KEYS_DIR: str | None = None
+    JWT_SIGNING_KID: str | None = None
+    JWT_KEY_ACTIVATION_SECONDS: int = 3600
+    JWT_KEYS_RELOAD_SECONDS: int = 60
+    # Authorise from token claims, only checking a cached per-user token version
+    STATELESS_TOKENS: bool = False
+    TOKEN_VERSION_CACHE_TTL_SECONDS: int = 30
+
+    # Password hashing (process pool, None = one worker per CPU, 0 = inline)
+    HASHING_WORKERS: int | None = None
+    HASHING_MAX_PENDING: int | None = None
+    # Argon2 cost, chọn bằng python calibrate_argon2.py (memory tính bằng KiB)
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+
+    # Throttling: "memory" hoặc "package.module:factory" cho store dùng chung
+    THROTTLE_ENABLED: bool = True
+    THROTTLE_BACKEND: str = "memory"
+    THROTTLE_WINDOW_SECONDS: int = 900
+    THROTTLE_LOCKOUT_SECONDS: int = 900
+    THROTTLE_LOGIN_IP_LIMIT: int = 50
+    THROTTLE_LOGIN_ACCOUNT_LIMIT: int = 10
+    THROTTLE_BACKOFF_AFTER: int = 3
+    THROTTLE_BACKOFF_BASE_SECONDS: float = 1.0
+    THROTTLE_REGISTER_LIMIT: int = 20
+    THROTTLE_FORGOT_PASSWORD_LIMIT: int = 5
+
+    # /metrics endpoint, request middleware and SQL timing
+    METRICS_ENABLED: bool = True
+    # IP hoặc mạng (CIDR) được đọc /metrics, các client khác nhận 403
+    METRICS_ALLOWED_IPS: list[str] = ["127.0.0.1", "::1"]
+
+    # Cache of authenticated users for get_current_user
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_MAXSIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
 
     # Email (mô phỏng)
     MAIL_SERVER: str | None = None
@@ -15,6 +98,36 @@ class Settings(BaseSettings):
     MAIL_PASSWORD: str | None = None
     MAIL_PORT: int | None = None
     MAIL_FROM: str | None = None
+    MAIL_STARTTLS: bool = True
+
+    # Mail dispatcher (persistent SMTP connections + bounded queue)
+    MAIL_POOL_SIZE: int = 2
+    MAIL_QUEUE_SIZE: int = 1000
+    MAIL_BATCH_SIZE: int = 20
+    MAIL_MAX_RETRIES: int = 3
+
+    # Email outbox worker (mail_worker.py)
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_LEASE_SECONDS: int = 60
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_SECONDS: int = 30
+
+    # Dọn dẹp dữ liệu hết hạn (python sweep.py, hoặc trong server khi MAINTENANCE_ENABLED)
+    MAINTENANCE_ENABLED: bool = False
+    MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    MAINTENANCE_BATCH_SIZE: int = 500
+    # Pause between batches so other writers get the database lock
+    MAINTENANCE_BATCH_PAUSE_SECONDS: float = 0.2
+    # Accounts still unverified after this many days are deleted (0 = keep)
+    UNVERIFIED_ACCOUNT_RETENTION_DAYS: int = 7
+    # Expired refresh tokens are kept this many days for reuse detection
+    REFRESH_TOKEN_RETENTION_DAYS: int = 1
+
+    # Idempotency-Key cho register, forgot-password, resend-verification
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_MAX_KEYS: int = 10000
 
     # Frontend URL (cho reset password)
     FRONTEND_URL: str = "http://localhost:3000"
@@ -1,26 +1,47 @@
+import hashlib
+import secrets
 from datetime import datetime, timedelta, timezone
-from sqlmodel import Session, select, or_
+from sqlmodel import Session, select, update, delete, or_, func, case
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 
 from app import models, exceptions, security
+from app.cache import invalidate_user, invalidate_token_version, recently_written
+from app.config import settings
+from app.database import REPLICA_READ, pin_primary, release_connection, run_sync
 
 # User READ operations
 def get_user(session: Session, user_id: int):
     """Find user by user id"""
 
-    return session.get(models.UserDB, user_id)
+    return session.get(models.UserDB, user_id, bind_arguments=REPLICA_READ)
+
+def get_users_by_ids(session: Session, user_ids: list[int]) -> list[models.UserDB]:
+    """Find several users with a single IN query, missing ids are left out"""
+
+    if not user_ids:
+        return []
+    statement = select(models.UserDB).where(models.UserDB.id.in_(user_ids))
+    return session.exec(statement, bind_arguments=REPLICA_READ).all()
+
+def get_token_version(session: Session, user_id: int) -> int | None:
+    """Current token version of a user, None if the user no longer exists"""
+
+    statement = select(models.UserDB.token_version).where(models.UserDB.id == user_id)
+    return session.exec(statement).first()
 
 def get_user_by_email(session: Session, email: str):
     """Find user by email"""
 
     statement = select(models.UserDB).where(models.UserDB.email == email)
-    return session.exec(statement).first()
+    return session.exec(statement, bind_arguments=REPLICA_READ).first()
 
 def get_user_by_username(session: Session, username: str):
     """Find user by username"""
 
     statement = select(models.UserDB).where(models.UserDB.username == username)
-    return session.exec(statement).first()
+    return session.exec(statement, bind_arguments=REPLICA_READ).first()
 
 def get_user_by_username_or_email(session: Session, username_or_email: str):
     """Find user by username or email"""
@@ -31,181 +52,688 @@ def get_user_by_username_or_email(session: Session, username_or_email: str):
             models.UserDB.email == username_or_email
         )
     )
+    return session.exec(statement, bind_arguments=REPLICA_READ).first()
+
+def get_user_by_reset_token(session: Session, token: str):
+    """Find user by a reset token that has not expired"""
+
+    now = datetime.now(timezone.utc)
+    statement = select(models.UserDB).where(
+        models.UserDB.reset_token_hash == security.hash_token(token),
+        models.UserDB.reset_token_expires > now
+    )
+    return session.exec(statement).first()
+
+def reload_user(session: Session, user_id: int, lock: bool = False) -> models.UserDB | None:
+    """Read a user again from the primary, replacing the copy in the session.
+
+    That copy may come from the user cache and be out of date. With ``lock``
+    the row stays locked until the transaction ends (where supported).
+    """
+
+    pin_primary(session)
+    statement = (
+        select(models.UserDB)
+        .where(models.UserDB.id == user_id)
+        .execution_options(populate_existing=True)
+    )
+    if lock:
+        statement = statement.with_for_update()
     return session.exec(statement).first()
 
+def user_etag(user: models.UserDB) -> str:
+    """Strong ETag of the UserResponse representation of a user.
+
+    A digest of the exposed fields rather than updated_at, which SQLite stores
+    with one second resolution.
+    """
+
+    fields = tuple(getattr(user, name) for name in models.UserResponse.model_fields)
+    return '"' + hashlib.sha256(repr(fields).encode()).hexdigest()[:32] + '"'
+
+def detach_user(user: models.UserDB) -> models.UserDB:
+    """Return a detached copy of a loaded user that can be shared between sessions"""
+
+    copy = models.UserDB.model_validate(user)
+    make_transient_to_detached(copy)
+    return copy
+
+def attach_user(session: Session, user: models.UserDB) -> models.UserDB:
+    """Bring a detached user into this session without a SELECT"""
+
+    return session.merge(user, load=False)
+
 def get_users(session: Session, skip: int = 0, limit: int = 100) -> list[models.UserDB]:
     statement = select(models.UserDB).offset(skip).limit(limit)
-    return session.exec(statement).all()
+    return session.exec(statement, bind_arguments=REPLICA_READ).all()
+
+def get_users_page(session: Session, after_id: int | None = None, limit: int = 100) -> list[models.UserDB]:
+    """Keyset page of users ordered by id, starting after ``after_id``"""
+
+    statement = select(models.UserDB).order_by(models.UserDB.id).limit(limit)
+    if after_id is not None:
+        statement = statement.where(models.UserDB.id > after_id)
+    return session.exec(statement, bind_arguments=REPLICA_READ).all()
+
+def select_users_for_export(batch_size: int = 1000):
+    return select(models.UserDB).order_by(models.UserDB.id).execution_options(yield_per=batch_size)
+
+def iter_users(session: Session, batch_size: int = 1000):
+    """Yield all users in id order, in batches read from a server-side cursor"""
+
+    result = session.exec(select_users_for_export(batch_size), bind_arguments=REPLICA_READ)
+    for partition in result.partitions():
+        yield partition
 
 # User WRITE operations
-def create_user(session: Session, user_create: models.UserCreate):
-    """Create a new user"""
-    
-    # Check exists
-    if get_user_by_username(session, user_create.username):
+def raise_conflict(error: IntegrityError):
+    """Turn a unique constraint violation into the matching UserAlreadyExists"""
+
+    message = str(error.orig)
+    if "users.email" in message or "ix_users_email" in message:
+        raise exceptions.UserAlreadyExists("Email already registered")
+    if "users.username" in message or "ix_users_username" in message:
         raise exceptions.UserAlreadyExists("Username already taken")
+    raise exceptions.UserAlreadyExists("Email or username has been compromised")
+
+def save_user(session: Session, user: models.UserDB):
+    """Persist pending changes on a user.
+
+    Server generated columns come back through RETURNING (eager_defaults), so the
+    user does not need a refresh afterwards.
+    """
+
+    session.add(user)
     
-    if get_user_by_email(session, user_create.email):
-        raise exceptions.UserAlreadyExists("Email already registered")
+    try:
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        raise_conflict(e)
+
+    invalidate_user(user.username, user.email)
+    return user
+
+def update_user_where(session: Session, criteria: list, values: dict) -> models.UserDB | None:
+    """Update the single user matching ``criteria`` and return it (without committing).
+
+    Uses one conditional UPDATE ... RETURNING when the backend supports it, otherwise
+    a SELECT followed by an ORM update.
+    """
+
+    if session.get_bind().dialect.update_returning:
+        statement = update(models.UserDB).where(*criteria).values(**values).returning(models.UserDB)
+        return session.exec(statement).scalars().first()
+
+    user = session.exec(select(models.UserDB).where(*criteria)).first()
+    if user is not None:
+        user.sqlmodel_update(values)
+        session.add(user)
+        session.flush()
+    return user
+
+# Functions that hash passwords are async and accept a Session or an AsyncSession
+async def create_user(session: Session | AsyncSession, user_create: models.UserCreate):
+    """Create a new user and queue its verification email"""
     
     # Create hash password and token
-    hashed_pw = security.get_password_hash(user_create.password)
+    hashed_pw = await security.get_password_hash_async(user_create.password)
     v_token = security.create_verification_token()
 
     # Convert from schema to model database
     db_user = models.UserDB.model_validate(
         user_create,
-        update={"hashed_password": hashed_pw, "verification_token": v_token}
+        update={"hashed_password": hashed_pw, "verification_token_hash": security.hash_token(v_token)}
     )
 
-    session.add(db_user)
-    
-    try:
-        session.commit()
-    except IntegrityError:
-        session.rollback()
-        raise exceptions.UserAlreadyExists("Email or username has been compromised")
+    queue_email(session, models.EmailKind.VERIFY_EMAIL, db_user, v_token)
 
-    session.refresh(db_user)
-    return db_user
+    # Duplicates are reported by the unique constraints
+    return await run_sync(session, save_user, db_user)
 
-def update_user(session: Session, user_id: int, user_update: models.UserUpdate):
-    """Update user information"""
-    
-    db_user = get_user(session, user_id)
-    if not db_user:
-        raise exceptions.UserNotFound()
-    
-    update_data = user_update.model_dump(exclude_unset=True)
+def update_user(session: Session, user_id: int, user_update: models.UserUpdate, if_match: list[str] | None = None):
+    """Update user information.
 
-    if "email" in update_data and update_data["email"] != db_user.email:
-        if get_user_by_email(session, update_data["email"]):
-            raise exceptions.UserAlreadyExists("Email already registered")
-        
-    if "username" in update_data and update_data["username"] != db_user.username:
-        if get_user_by_username(session, update_data["username"]):
-            raise exceptions.UserAlreadyExists("Username already taken")
+    With ``if_match`` (ETags), the row is read again from the primary under a
+    row lock and the update only happens if it still has one of these ETags.
+    Otherwise the cached user is dropped too: GET /user/me computes its ETag
+    from it, and the client's next read must see the row it was checked against.
+    The values are written with one UPDATE, never computed from the session's
+    copy of the user, which may be a cached one.
+    """
     
-    db_user.sqlmodel_update(update_data)
+    db_user = None
+    if if_match is not None:
+        db_user = reload_user(session, user_id, lock=True)
+        if db_user is None:
+            raise exceptions.UserNotFound()
+        if user_etag(db_user) not in if_match:
+            session.rollback()
+            invalidate_user(db_user.username, db_user.email)
+            raise exceptions.PreconditionFailed()
+
+    update_data = user_update.model_dump(exclude_unset=True)
+    if not update_data:
+        db_user = db_user or get_user(session, user_id)
+        if not db_user:
+            raise exceptions.UserNotFound()
+        return db_user
+
+    # The user is cached under its old username and email too: read them first
+    # when they may change, other updates need no SELECT
+    old_subjects = ()
+    if "username" in update_data or "email" in update_data:
+        db_user = db_user or reload_user(session, user_id)
+        if not db_user:
+            raise exceptions.UserNotFound()
+        old_subjects = (db_user.username, db_user.email)
+
+    # Tokens issued before carry the old identity in their claims: bump their version
+    # if the row's identity really changes, decided by the database
+    identity = [getattr(models.UserDB, name) != update_data[name] for name in ("username", "email") if name in update_data]
+    values = dict(update_data)
+    if identity:
+        values["token_version"] = case((or_(*identity), models.UserDB.token_version + 1), else_=models.UserDB.token_version)
 
-    session.add(db_user)
-    
     try:
+        updated = update_user_where(session, [models.UserDB.id == user_id], values)
         session.commit()
-    except IntegrityError:
+    except IntegrityError as e:
         session.rollback()
-        raise exceptions.UserAlreadyExists("Email or username has been compromised")
+        raise_conflict(e)
+    if not updated:
+        raise exceptions.UserNotFound()
+
+    invalidate_user(*old_subjects, updated.username, updated.email)
+    if identity:
+        invalidate_token_version(user_id)
+    return updated
+
+def set_admin(session: Session, username_or_email: str, is_admin: bool) -> models.UserDB:
+    """Grant or revoke admin rights.
+
+    The token version is bumped too, so stateless tokens issued with the old
+    admin claim stop working.
+    """
+
+    user = update_user_where(
+        session,
+        [or_(models.UserDB.username == username_or_email, models.UserDB.email == username_or_email)],
+        {"is_admin": is_admin, "token_version": models.UserDB.token_version + 1}
+    )
+    if not user:
+        raise exceptions.UserNotFound()
 
-    session.refresh(db_user)
-    return db_user
+    session.commit()
+    invalidate_user(user.username, user.email)
+    invalidate_token_version(user.id)
+    return user
 
 def delete_user(session: Session, user_id: int):
     """Delete user"""
 
-    db_user = get_user(session, user_id)
-    if not db_user:
+    statement = delete(models.UserDB).where(models.UserDB.id == user_id)
+
+    if session.get_bind().dialect.delete_returning:
+        subjects = session.exec(statement.returning(models.UserDB.username, models.UserDB.email)).first()
+    else:
+        db_user = get_user(session, user_id)
+        subjects = db_user and (db_user.username, db_user.email)
+        if subjects:
+            session.exec(statement)
+
+    if not subjects:
         raise exceptions.UserNotFound()
-    
-    session.delete(db_user)
+
     session.commit()
+    invalidate_user(*subjects)
+    invalidate_token_version(user_id)
     return True
 
 # Auth and Token operations
-def authenticate_user(session: Session, username: str, password: str):
+async def authenticate_user(session: Session | AsyncSession, username: str, password: str):
     """User authentication"""
     
-    user: models.UserDB = get_user_by_username_or_email(session, username)
-    if not user or not security.verify_password(password, user.hashed_password):
+    if recently_written.get(username):
+        pin_primary(session)
+    user: models.UserDB = await run_sync(session, get_user_by_username_or_email, username)
+    if not user:
+        raise exceptions.IncorrectCredentials()
+
+    # Not holding a connection while the password is checked
+    await release_connection(session)
+    valid, new_hash = await security.verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
         raise exceptions.IncorrectCredentials()
     
     if not user.is_active:
         raise exceptions.UserInactive()
 
+    if new_hash:
+        user = await run_sync(session, rehash_password, user, new_hash) or user
+
     return user
 
+def rehash_password(session: Session, user: models.UserDB, new_hash: str):
+    """Store a hash upgraded to the current Argon2 parameters.
+
+    Skipped if the password changed since it was verified.
+    """
+
+    updated = update_user_where(
+        session,
+        [models.UserDB.id == user.id, models.UserDB.hashed_password == user.hashed_password],
+        {"hashed_password": new_hash}
+    )
+    session.commit()
+    invalidate_user(user.username, user.email)
+    return updated
+
 def verify_email_token(session: Session, token: str):
     """Verify email using a token"""
 
-    statement = select(models.UserDB).where(models.UserDB.verification_token == token)
-    user = session.exec(statement).first()
+    token_hash = security.hash_token(token)
+    user = update_user_where(
+        session,
+        [models.UserDB.verification_token_hash == token_hash, models.UserDB.is_verified == False],
+        {"is_verified": True, "verification_token_hash": None}
+    )
 
     if not user:
+        # Failure path only: tell an unknown token from an already verified account
+        statement = select(models.UserDB.id).where(models.UserDB.verification_token_hash == token_hash)
+        if session.exec(statement).first():
+            raise exceptions.UserAlreadyVerified()
         raise exceptions.UserNotFound()
-    
-    if user.is_verified:
-        raise exceptions.UserAlreadyVerified()
 
-    user.is_verified = True
-    user.verification_token = None
-    session.add(user)
     session.commit()
-    session.refresh(user)
+    invalidate_user(user.username, user.email)
     return user
 
-def regenerate_verification_token(session: Session, user: models.UserDB):
-    """Regenerate verification token"""
+def regenerate_verification_token(session: Session, user_id: int):
+    """Regenerate the verification token, only while the email is not verified"""
 
-    if user.is_verified:
+    v_token = security.create_verification_token()
+    user = update_user_where(
+        session,
+        [models.UserDB.id == user_id, models.UserDB.is_verified == False],
+        {"verification_token_hash": security.hash_token(v_token)}
+    )
+    if user is None:
+        session.rollback()
+        if get_user(session, user_id) is None:
+            raise exceptions.UserNotFound()
         raise exceptions.UserAlreadyVerified()
-    
-    user.verification_token = security.create_verification_token()
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user.verification_token
 
-def create_password_reset_token(session: Session, email: str):
-    """Create a password reset token"""
+    queue_email(session, models.EmailKind.VERIFY_EMAIL, user, v_token)
+    session.commit()
+    invalidate_user(user.username, user.email)
+    return v_token
+
+def create_password_reset_token(session: Session, email: str) -> tuple[models.UserDB, str]:
+    """Create a password reset token, return the user and the token"""
+
+    reset_token = security.create_reset_token()
+    user = update_user_where(
+        session,
+        [models.UserDB.email == email],
+        {
+            "reset_token_hash": security.hash_token(reset_token),
+            "reset_token_expires": datetime.now(timezone.utc) + timedelta(hours=24)
+        }
+    )
 
-    user: models.UserDB = get_user_by_email(session, email)
     if not user:
         raise exceptions.UserNotFound()
     
-    user.reset_token = security.create_reset_token()
-    user.reset_token_expires = datetime.now(timezone.utc) + timedelta(hours=24)
+    queue_email(session, models.EmailKind.RESET_PASSWORD, user, reset_token)
+    session.commit()
+    invalidate_user(user.username, user.email)
+    return user, reset_token
+
+def consume_reset_token(session: Session, user_id: int, token: str, hashed_password: str):
+    """Set a new password hash if the reset token is still unused"""
+
+    user = update_user_where(
+        session,
+        [models.UserDB.id == user_id, models.UserDB.reset_token_hash == security.hash_token(token)],
+        {
+            "hashed_password": hashed_password,
+            "reset_token_hash": None,
+            "reset_token_expires": None,
+            "token_version": models.UserDB.token_version + 1
+        }
+    )
 
-    session.add(user)
+    # The token was used by a concurrent request
+    if not user:
+        raise exceptions.InvalidToken()
+
+    revoke_refresh_tokens(session, models.RefreshToken.user_id == user.id)
     session.commit()
-    return user.reset_token
+    invalidate_user(user.username, user.email)
+    invalidate_token_version(user.id)
+    return user
     
-def reset_password(session: Session, token: str, new_password: str):
+async def reset_password(session: Session | AsyncSession, token: str, new_password: str):
     """Reset password using token"""
 
-    now = datetime.now(timezone.utc)
-    statement = select(models.UserDB).where(
-        models.UserDB.reset_token == token,
-        models.UserDB.reset_token_expires > now
-    )
-    user = session.exec(statement).first()
+    user: models.UserDB = await run_sync(session, get_user_by_reset_token, token)
 
     if not user:
         raise exceptions.InvalidToken()
     
-    if security.verify_password(new_password, user.hashed_password):
+    await release_connection(session)
+    if await security.verify_password_async(new_password, user.hashed_password):
         raise exceptions.PasswordSameAsOld()
     
-    user.hashed_password = security.get_password_hash(new_password)
-    user.reset_token = None
-    user.reset_token_expires = None
+    hashed_pw = await security.get_password_hash_async(new_password)
 
-    session.add(user)
+    return await run_sync(session, consume_reset_token, user.id, token, hashed_pw)
+
+def replace_password(session: Session, user: models.UserDB, hashed_password: str) -> models.UserDB:
+    """Store a new password hash if the current one is still the one that was verified"""
+
+    updated = update_user_where(
+        session,
+        [models.UserDB.id == user.id, models.UserDB.hashed_password == user.hashed_password],
+        {"hashed_password": hashed_password, "token_version": models.UserDB.token_version + 1}
+    )
+    # Changed by a concurrent request while the new password was hashed
+    if not updated:
+        session.rollback()
+        raise exceptions.IncorrectCredentials()
+
+    revoke_refresh_tokens(session, models.RefreshToken.user_id == user.id)
     session.commit()
-    session.refresh(user)
-    return user
+    invalidate_user(updated.username, updated.email)
+    invalidate_token_version(updated.id)
+    return updated
 
-def change_password(session: Session, user_id: int, current_password: str, new_password: str):
+async def change_password(session: Session | AsyncSession, user_id: int, current_password: str, new_password: str):
     """Change your password when you know the old password"""
 
-    user: models.UserDB = get_user(session, user_id)
+    # Not the cached current user: the password is checked against the current hash
+    user: models.UserDB = await run_sync(session, reload_user, user_id)
     if not user:
         raise exceptions.UserNotFound()
     
-    if not security.verify_password(current_password, user.hashed_password):
+    await release_connection(session)
+    if not await security.verify_password_async(current_password, user.hashed_password):
         raise exceptions.IncorrectCredentials()
     
-    user.hashed_password = security.get_password_hash(new_password)
+    hashed_pw = await security.get_password_hash_async(new_password)
 
-    session.add(user)
+    return await run_sync(session, replace_password, user, hashed_pw)
+
+# Refresh token operations
+def create_refresh_token(session: Session, user_id: int, family_id: str | None = None) -> str:
+    """Issue a refresh token, a new family starts at each login"""
+
+    token = security.create_refresh_token()
+    session.add(models.RefreshToken(
+        user_id=user_id,
+        token_hash=security.hash_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    session.commit()
+    return token
+
+def revoke_refresh_tokens(session: Session, *criteria) -> int:
+    """Revoke live refresh tokens matching ``criteria`` (without committing)"""
+
+    statement = (
+        update(models.RefreshToken)
+        .where(*criteria, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    return session.exec(statement).rowcount
+
+def rotate_refresh_token(session: Session, token: str) -> tuple[models.UserDB, str]:
+    """Exchange a refresh token for a new one of the same family.
+
+    Presenting a token that was already rotated means it leaked (or the client
+    raced itself), so the whole family is revoked.
+    """
+
+    statement = (
+        select(models.RefreshToken, models.UserDB)
+        .join(models.UserDB, models.UserDB.id == models.RefreshToken.user_id)
+        .where(models.RefreshToken.token_hash == security.hash_token(token))
+    )
+    row = session.exec(statement).first()
+    if not row:
+        raise exceptions.InvalidRefreshToken()
+
+    refresh_token, user = row
+    now = datetime.now(timezone.utc)
+
+    # Consume the token only if it is still live, so concurrent reuse is caught too
+    consumed = revoke_refresh_tokens(
+        session,
+        models.RefreshToken.id == refresh_token.id,
+        models.RefreshToken.expires_at > now
+    )
+    if not consumed:
+        # Already rotated or expired: nothing live may remain in this family
+        revoke_refresh_tokens(session, models.RefreshToken.family_id == refresh_token.family_id)
+        session.commit()
+        raise exceptions.InvalidRefreshToken()
+
+    if not user.is_active:
+        session.commit()
+        raise exceptions.UserInactive()
+
+    return user, create_refresh_token(session, user.id, refresh_token.family_id)
+
+# Maintenance operations (each call handles one bounded batch and commits it)
+def clear_expired_reset_tokens(session: Session, limit: int) -> int:
+    """Null up to ``limit`` reset tokens that have expired"""
+
+    expired = (
+        select(models.UserDB.id)
+        .where(models.UserDB.reset_token_expires < datetime.now(timezone.utc))
+        .limit(limit)
+    )
+    statement = (
+        update(models.UserDB)
+        .where(models.UserDB.id.in_(expired))
+        .values(reset_token_hash=None, reset_token_expires=None)
+        .execution_options(synchronize_session=False)
+    )
+    count = session.exec(statement).rowcount
+    session.commit()
+    return count
+
+def delete_unverified_users(session: Session, created_before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` accounts never verified since before ``created_before``"""
+
+    abandoned = [
+        models.UserDB.is_verified == False,
+        models.UserDB.verification_token_hash.is_not(None),
+        models.UserDB.created_at < created_before
+    ]
+    rows = session.exec(
+        select(models.UserDB.id, models.UserDB.username, models.UserDB.email).where(*abandoned).limit(limit)
+    ).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    session.exec(delete(models.RefreshToken).where(models.RefreshToken.user_id.in_(ids)))
+    # The conditions again: an account verified since the SELECT is kept
+    count = session.exec(delete(models.UserDB).where(models.UserDB.id.in_(ids), *abandoned)).rowcount
+    session.commit()
+
+    for row in rows:
+        invalidate_user(row.username, row.email)
+        invalidate_token_version(row.id)
+    return count
+
+def delete_expired_refresh_tokens(session: Session, expired_before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` refresh tokens that expired before ``expired_before``"""
+
+    expired = (
+        select(models.RefreshToken.id)
+        .where(models.RefreshToken.expires_at < expired_before)
+        .limit(limit)
+    )
+    count = session.exec(delete(models.RefreshToken).where(models.RefreshToken.id.in_(expired))).rowcount
+    session.commit()
+    return count
+
+# Access token revocation
+def revoke_access_token(session: Session, token_data: models.TokenData, refresh_token: str | None = None):
+    """Record the logout of an access token, and revoke the refresh token family of that login"""
+
+    session.add(models.RevokedToken(
+        jti=token_data.jti,
+        user_id=token_data.user_id,
+        expires_at=token_data.expires_at,
+        revoked_at=datetime.now(timezone.utc)
+    ))
+    if refresh_token:
+        family = (
+            select(models.RefreshToken.family_id)
+            .where(models.RefreshToken.token_hash == security.hash_token(refresh_token))
+            .scalar_subquery()
+        )
+        # Only the caller's own refresh tokens
+        criteria = [models.RefreshToken.family_id == family]
+        if token_data.user_id is not None:
+            criteria.append(models.RefreshToken.user_id == token_data.user_id)
+        revoke_refresh_tokens(session, *criteria)
+
+    try:
+        session.commit()
+    except IntegrityError:
+        # Logged out twice
+        session.rollback()
+
+def get_revoked_tokens(session: Session, since: datetime | None = None) -> list[tuple[str, datetime]]:
+    """(jti, expires_at) of unexpired revoked tokens, only those revoked since ``since`` if given"""
+
+    statement = select(models.RevokedToken.jti, models.RevokedToken.expires_at).where(
+        models.RevokedToken.expires_at > datetime.now(timezone.utc)
+    )
+    if since is not None:
+        statement = statement.where(models.RevokedToken.revoked_at >= since)
+    return session.exec(statement).all()
+
+def delete_expired_revocations(session: Session, limit: int) -> int:
+    """Delete up to ``limit`` revocations of tokens that have expired anyway"""
+
+    expired = (
+        select(models.RevokedToken.id)
+        .where(models.RevokedToken.expires_at < datetime.now(timezone.utc))
+        .limit(limit)
+    )
+    count = session.exec(delete(models.RevokedToken).where(models.RevokedToken.id.in_(expired))).rowcount
+    session.commit()
+    return count
+
+# Email outbox operations
+def queue_email(session: Session | AsyncSession, kind: models.EmailKind, user: models.UserDB, token: str):
+    """Add an email to the outbox, it is committed together with the caller's change"""
+
+    session.add(models.EmailOutbox(
+        kind=kind.value,
+        recipient=user.email,
+        payload={"username": user.username, "token": token}
+    ))
+
+def count_outbox(session: Session) -> int:
+    """Number of emails waiting in the outbox, including leased and failing ones"""
+
+    return session.exec(select(func.count()).select_from(models.EmailOutbox)).one()
+
+def claim_emails(session: Session, worker_id: str, limit: int, lease_seconds: int, max_attempts: int) -> list[models.EmailOutbox]:
+    """Lease up to ``limit`` pending emails to this worker.
+
+    On Postgres the candidate rows are locked with SKIP LOCKED so concurrent workers
+    never wait on each other; on SQLite the single UPDATE is atomic on its own.
+    """
+
+    now = datetime.now(timezone.utc)
+    claim = f"{worker_id}:{secrets.token_hex(8)}"
+
+    candidates = (
+        select(models.EmailOutbox.id)
+        .where(
+            models.EmailOutbox.attempts < max_attempts,
+            or_(models.EmailOutbox.locked_until.is_(None), models.EmailOutbox.locked_until < now)
+        )
+        .order_by(models.EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.id.in_(candidates))
+        .values(locked_by=claim, locked_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    session.exec(statement)
+    session.commit()
+
+    statement = select(models.EmailOutbox).where(models.EmailOutbox.locked_by == claim)
+    return session.exec(statement.execution_options(populate_existing=True)).all()
+
+def finish_emails(
+    session: Session,
+    sent: list[models.EmailOutbox],
+    failed: list[tuple[models.EmailOutbox, str]],
+    retry_seconds: int,
+    max_attempts: int
+) -> int:
+    """Delete sent emails, release failed ones for a later retry with backoff.
+
+    Only rows still held by the claim that leased them are touched: once the
+    lease is over another worker may have claimed a row again, and it owns it
+    now. Returns the number of rows lost that way. A row failing its last
+    attempt keeps its error but not its token, the sweeper deletes it later.
+    """
+
+    lost = 0
+    if sent:
+        statement = delete(models.EmailOutbox).where(
+            models.EmailOutbox.id.in_([row.id for row in sent]),
+            models.EmailOutbox.locked_by.in_({row.locked_by for row in sent})
+        )
+        lost += len(sent) - session.exec(statement).rowcount
+
+    now = datetime.now(timezone.utc)
+    for row, error in failed:
+        attempts = row.attempts + 1
+        values = {
+            "attempts": models.EmailOutbox.attempts + 1,
+            "last_error": error,
+            "locked_by": None,
+            "locked_until": now + timedelta(seconds=retry_seconds * 2 ** (attempts - 1)),
+        }
+        if attempts >= max_attempts:
+            values["payload"] = {key: value for key, value in row.payload.items() if key != "token"}
+        statement = (
+            update(models.EmailOutbox)
+            .where(models.EmailOutbox.id == row.id, models.EmailOutbox.locked_by == row.locked_by)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        lost += 1 - session.exec(statement).rowcount
+
+    session.commit()
+    return lost
+
+def delete_dead_emails(session: Session, max_attempts: int, limit: int) -> int:
+    """Delete up to ``limit`` emails that failed all their attempts and are never sent"""
+
+    dead = (
+        select(models.EmailOutbox.id)
+        .where(models.EmailOutbox.attempts >= max_attempts)
+        .limit(limit)
+    )
+    count = session.exec(delete(models.EmailOutbox).where(models.EmailOutbox.id.in_(dead))).rowcount
     session.commit()
-    session.refresh(user)
-    return user
\ No newline at end of file
+    return count
@@ -1,16 +1,247 @@
-from sqlmodel import Session, SQLModel, create_engine
+import os
+import random
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .config import settings
+from .metrics import stage_duration
+
+database_url = make_url(settings.DATABASE_URL)
+
+# Async mode is selected by the driver in DATABASE_URL (ví dụ sqlite+aiosqlite://)
+is_async = database_url.get_dialect().is_async
+
+is_sqlite = database_url.get_backend_name() == "sqlite"
+is_memory = is_sqlite and database_url.database in (None, "", ":memory:")
+
+# Created by init_engines() in each server worker (lifespan) or script, never at import,
+# so a pre-fork server does not hand the same pool to every worker
+engine: Engine | None = None
+async_engine: AsyncEngine | None = None
+# Read only engines: the replicas in DATABASE_REPLICA_URLS, or in SQLite single writer
+# mode a reader pool on the same file while the engines above keep one writer connection
+read_engines: list[Engine] = []
+async_read_engines: list[AsyncEngine] = []
+
+replica_urls = [make_url(url) for url in settings.DATABASE_REPLICA_URLS]
+
+def pool_options(url, single_connection: bool = False) -> dict:
+    if single_connection:
+        # Writers wait in line for the connection instead of retrying on "database is locked"
+        return {"pool_size": 1, "max_overflow": 0, "pool_timeout": settings.DB_POOL_TIMEOUT}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def sqlite_pragmas(read_only: bool = False):
+    """Connect listener applying the SQLITE_* profile to every new connection"""
+
+    pragmas = [
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+        ("cache_size", settings.SQLITE_CACHE_SIZE),
+        ("query_only", 1 if read_only else 0),
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            # Empty / 0 keeps the SQLite default
+            if value:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return set_pragmas
+
+def make_engines(url, read_only: bool = False) -> tuple[Engine, AsyncEngine | None]:
+    sqlite = url.get_backend_name() == "sqlite"
+    # Only the primary's writer is limited to one connection, its reader pool is a normal pool
+    single_writer = url is database_url and not read_only and is_sqlite and not is_memory and settings.SQLITE_SINGLE_WRITER
+    options = {
+        "connect_args": {"check_same_thread": False} if sqlite else {},
+        **pool_options(url, single_writer)
+    }
+
+    # The sync engine always exists: it is used for DDL and command line scripts
+    sync_engine = create_engine(
+        url.set(drivername=url.get_backend_name()) if is_async else url,
+        # echo=True,           # Log các câu lệnh SQL ra terminal (tiện để debug)
+        **options
+    )
+    async_engine = create_async_engine(url, **options) if is_async else None
+
+    for target in filter(None, (sync_engine, async_engine and async_engine.sync_engine)):
+        if sqlite:
+            event.listen(target, "connect", sqlite_pragmas(read_only))
+        if settings.METRICS_ENABLED:
+            time_queries(target)
+    return sync_engine, async_engine
+
+def init_engines():
+    """Create the engines of this process, calling it again is a no-op"""
+
+    global engine, async_engine
+    if engine is not None:
+        return
+
+    engine, async_engine = make_engines(database_url)
+    if replica_urls:
+        readers = [make_engines(url, read_only=True) for url in replica_urls]
+    elif is_sqlite and not is_memory and settings.SQLITE_SINGLE_WRITER:
+        readers = [make_engines(database_url, read_only=True)]
+    else:
+        readers = []
+    read_engines[:] = [sync_engine for sync_engine, _ in readers]
+    async_read_engines[:] = [async_engine for _, async_engine in readers if async_engine is not None]
+
+def all_engines() -> list[Engine]:
+    """Sync engines (or the sync side of async engines) currently open, for events and gauges"""
+
+    engines = [engine, async_engine and async_engine.sync_engine, *read_engines]
+    engines += [e.sync_engine for e in async_read_engines]
+    return [e for e in engines if e is not None]
+
+async def dispose_engines():
+    """Close pooled connections on shutdown"""
+
+    global engine, async_engine
+    for async_target in filter(None, (async_engine, *async_read_engines)):
+        await async_target.dispose()
+    for sync_target in filter(None, (engine, *read_engines)):
+        sync_target.dispose()
+    engine = async_engine = None
+    read_engines.clear()
+    async_read_engines.clear()
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    # echo=True,           # Log các câu lệnh SQL ra terminal (tiện để debug)
-    connect_args={"check_same_thread": False}
-)
+def reset_after_fork():
+    # A forked child must not reuse the parent's connections, it opens its own
+    for target in all_engines():
+        target.dispose(close=False)
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+def time_queries(engine: Engine):
+    """Record every statement's execution time in the sql stage histogram"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info["query_started"].pop()
+        stage_duration.observe(time.perf_counter() - started, "sql")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute: drop its start time, or
+        # every error would leave one more entry on this pooled connection
+        conn = exception_context.connection
+        started = conn.info.get("query_started") if conn is not None else None
+        if started and started[-1][0] is exception_context.execution_context:
+            started.pop()
+
+# bind_arguments of the reads that may run on a replica: user lookups and listings,
+# which tolerate lag. Single use tokens (refresh, reset, verification) were just
+# written on the primary and are always read there.
+REPLICA_READ = {"replica": True}
+
+class RoutingSession(Session):
+    """Session sending reads to a read only engine and writes to the primary.
+
+    Flushes, DML and raw SQL go to the primary, and so does everything after a
+    write. With replicas only reads executed with ``bind_arguments=REPLICA_READ``
+    use one, the others stay on the primary; the session (one per request) is
+    pinned to the primary after a write, so a request never reads older data
+    than it wrote. The SQLite reader pool sees the same file without lag, there
+    every read uses it and the pin ends with the transaction.
+    """
+
+    def get_bind(self, mapper=None, clause=None, replica=False, **kwargs):
+        if self.info.get("writing") or self._flushing or isinstance(clause, (UpdateBase, TextClause)):
+            self.info["writing"] = True
+            target = async_engine if is_async else engine
+        elif replica_urls and not replica:
+            target = async_engine if is_async else engine
+        else:
+            # One replica per session, so its reads see a single point in time
+            if "reader" not in self.info:
+                self.info["reader"] = random.choice(async_read_engines if is_async else read_engines)
+            target = self.info["reader"]
+        return target.sync_engine if is_async else target
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def end_writing(session, transaction):
+    if transaction.parent is None and not replica_urls:
+        session.info.pop("writing", None)
+
+def pin_primary(session: Session | AsyncSession):
+    """Send the remaining queries of this session to the primary"""
+
+    session.info["writing"] = True
 
 def create_db_and_table():
-    SQLModel.metadata.create_all(engine)
+    """Bring the schema up to date, returns the applied migration versions"""
+
+    from app import migrations
+
+    init_engines()
+    return migrations.migrate(engine)
 
 def get_session():
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+    # Same as the async session: crud relies on RETURNING, not on refresh after commit
+    if read_engines:
+        session = RoutingSession(expire_on_commit=False)
+    else:
+        session = Session(engine, expire_on_commit=False)
+    with session:
+        yield session
+
+async def get_async_session():
+    # Objects stay usable after commit, attribute access must not trigger lazy IO
+    if async_read_engines:
+        session = AsyncSession(sync_session_class=RoutingSession, expire_on_commit=False)
+    else:
+        session = AsyncSession(async_engine, expire_on_commit=False)
+    async with session:
+        yield session
+
+async def run_sync(session: Session | AsyncSession, fn, *args, **kwargs):
+    """Call a sync function taking a Session with either kind of session.
+
+    With an AsyncSession the function runs through ``AsyncSession.run_sync`` so
+    its SQL is executed by the async driver without blocking the event loop.
+    """
+
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(fn, *args, **kwargs)
+    return fn(session, *args, **kwargs)
+
+async def release_connection(session: Session | AsyncSession):
+    """End the session's transaction so its connection goes back to the pool.
+
+    Call it before awaiting slow work such as password hashing: a sync session
+    would otherwise keep a pooled connection checked out meanwhile, and other
+    requests would block the event loop waiting for it. Loaded objects stay
+    usable, request sessions do not expire them on commit.
+    """
+
+    if isinstance(session, AsyncSession):
+        await session.commit()
+    else:
+        session.commit()
\ No newline at end of file
@@ -1,30 +1,61 @@
+import secrets
 from typing import Annotated
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, OAuth2PasswordBearer
 
-from app.database import get_session
-from app import crud, models, exceptions, security
+from app.database import get_session, get_async_session, is_async, pin_primary
+from app import async_crud, crud, models, exceptions, security
+from app.cache import user_cache, token_version_cache, recently_written
+from app.config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+client_scheme = HTTPBasic(auto_error=False)
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[Session | AsyncSession, Depends(get_async_session if is_async else get_session)]
 
-async def get_current_user(db : SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
+async def get_current_user(db : SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
     token_data = security.verify_token(token)
     if token_data is None:
         raise credentials_exception
     
-    user = crud.get_user_by_username_or_email(db, token_data.username)
+    return await load_user(db, token_data)
+
+async def load_user(db: Session | AsyncSession, token_data: models.TokenData) -> models.UserDB:
+    """The token's user, if the token was issued for its current token version"""
+
+    if settings.USER_CACHE_ENABLED:
+        cached_user = user_cache.get(token_data.username)
+        # Token versions only grow: an older token is outdated, a newer one means
+        # the user changed on another worker and the cached copy is
+        if cached_user is not None:
+            if token_data.token_version is not None and token_data.token_version < cached_user.token_version:
+                raise credentials_exception
+            if token_data.token_version in (None, cached_user.token_version):
+                return await async_crud.attach_user(db, cached_user)
+
+    # A replica may not have this process's latest write yet
+    if recently_written.get(token_data.username):
+        pin_primary(db)
+
+    user = await async_crud.get_user_by_username_or_email(db, token_data.username)
     if user is None:
         raise credentials_exception
     
+    if settings.USER_CACHE_ENABLED:
+        user_cache.set(token_data.username, crud.detach_user(user))
+
+    # Tokens issued before a password change or a username / email change
+    if token_data.token_version is not None and token_data.token_version != user.token_version:
+        raise credentials_exception
+
     return user
 
 async def get_current_active_user(
@@ -43,4 +74,88 @@ async def get_current_verified_user(
 
 CurrentUser = Annotated[models.UserDB, Depends(get_current_user)]
 ActiveUser = Annotated[models.UserDB, Depends(get_current_active_user)]
-VerifiedUser = Annotated[models.UserDB, Depends(get_current_verified_user)]
\ No newline at end of file
+VerifiedUser = Annotated[models.UserDB, Depends(get_current_verified_user)]
+
+async def get_current_principal(db: SessionDep, token: Annotated[str, Depends(oauth2_scheme)]):
+    """Identity of the caller for routes that do not need the user row.
+
+    With STATELESS_TOKENS the token claims are trusted as long as their token
+    version is still current, which is checked against a short lived cache.
+    Otherwise the claims come from the loaded user.
+    """
+
+    token_data = security.verify_token(token)
+    if token_data is None:
+        raise credentials_exception
+
+    if settings.STATELESS_TOKENS and token_data.user_id is not None and token_data.token_version is not None:
+        current_version = token_version_cache.get(token_data.user_id)
+        if current_version is None:
+            if recently_written.get(token_data.user_id):
+                pin_primary(db)
+            current_version = await async_crud.get_token_version(db, token_data.user_id)
+            if current_version is not None:
+                token_version_cache.set(token_data.user_id, current_version)
+
+        if current_version != token_data.token_version:
+            raise credentials_exception
+        return token_data
+
+    user = await load_user(db, token_data)
+    return models.TokenData(
+        username=user.username,
+        user_id=user.id,
+        is_active=user.is_active,
+        is_verified=user.is_verified,
+        is_admin=user.is_admin,
+        token_version=user.token_version
+    )
+
+async def get_current_active_principal(
+        principal: Annotated[models.TokenData, Depends(get_current_principal)]
+):
+    if not principal.is_active:
+        raise exceptions.UserInactive()
+    return principal
+
+async def get_current_verified_principal(
+        principal: Annotated[models.TokenData, Depends(get_current_active_principal)]
+):
+    if not principal.is_verified:
+        raise exceptions.UserNotVerified()
+    return principal
+
+CurrentPrincipal = Annotated[models.TokenData, Depends(get_current_principal)]
+ActivePrincipal = Annotated[models.TokenData, Depends(get_current_active_principal)]
+VerifiedPrincipal = Annotated[models.TokenData, Depends(get_current_verified_principal)]
+
+async def get_current_admin_user(
+        principal: Annotated[models.TokenData, Depends(get_current_verified_principal)]
+):
+    # The persisted is_admin flag (a token claim in stateless mode), never the username,
+    # which any user may register or change to
+    if not principal.is_admin:
+        raise exceptions.NotEnoughPermissions()
+    return principal
+
+AdminUser = Annotated[models.TokenData, Depends(get_current_admin_user)]
+
+async def get_introspection_client(
+        credentials: Annotated[HTTPBasicCredentials | None, Depends(client_scheme)]
+) -> str:
+    """Client id of a gateway listed in INTROSPECT_CLIENTS, authenticated with HTTP Basic"""
+
+    secret = settings.INTROSPECT_CLIENTS.get(credentials.username) if credentials else None
+    # Constant time, and the same work for an unknown client id
+    valid = secrets.compare_digest(
+        (secret or "").encode(), (credentials.password if credentials else "").encode()
+    )
+    if secret is None or not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid client credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
+
+IntrospectionClient = Annotated[str, Depends(get_introspection_client)]
\ No newline at end of file
@@ -1,51 +1,197 @@
+import asyncio
+import functools
+import logging
+import random
+from email.message import EmailMessage
 from pathlib import Path
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
 
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app import exceptions
+from app.metrics import stage_duration
 from app.config import settings
-from app.models import UserDB
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-
-    TEMPLATE_FOLDER=Path(__file__).parent / "templates",
+from app.models import EmailKind, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Built on first use, the environment then keeps each compiled template
+@functools.cache
+def templates() -> Environment:
+    return Environment(
+        loader=FileSystemLoader(Path(__file__).parent / "templates"),
+        autoescape=select_autoescape(["html"])
+    )
+
+def get_template(name: str):
+    return templates().get_template(name)
+
+class MailDispatcher:
+    """Send emails from a bounded queue over a few long-lived SMTP connections.
+
+    Each worker keeps its own authenticated connection open, takes up to
+    ``batch_size`` queued messages at a time and sends them back to back.
+    Failed sends are retried with exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 2,
+        queue_size: int = 1000,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        enqueue_timeout: float = 5.0
+    ):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.enqueue_timeout = enqueue_timeout
+        self.sent = 0
+        self.failed = 0
+        self._queue: asyncio.Queue[tuple[EmailMessage, asyncio.Future | None]] | None = None
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.pool_size)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Wait for queued messages to be sent, then close the connections"""
+
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} unsent emails on shutdown")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(self, message: EmailMessage, result: asyncio.Future | None = None):
+        """Queue a message, waiting for space up to ``enqueue_timeout`` seconds"""
+
+        self.start()
+        try:
+            await asyncio.wait_for(self._queue.put((message, result)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.MailQueueFull()
+
+    async def deliver(self, message: EmailMessage) -> bool:
+        """Queue a message and wait until it is sent, return False if sending failed"""
+
+        result = asyncio.get_running_loop().create_future()
+        await self.enqueue(message, result)
+        return await result
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            username=settings.MAIL_USERNAME,
+            password=settings.MAIL_PASSWORD,
+            start_tls=settings.MAIL_STARTTLS,
+        )
+        await smtp.connect()
+        return smtp
+
+    async def _close(self, smtp: aiosmtplib.SMTP | None):
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+    async def _send(self, smtp: aiosmtplib.SMTP | None, message: EmailMessage) -> tuple[aiosmtplib.SMTP | None, bool]:
+        """Send one message, reconnecting and retrying if needed.
+
+        Returns the connection to reuse and whether the message was sent.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with stage_duration.time("email_send"):
+                    if smtp is None or not smtp.is_connected:
+                        smtp = await self._connect()
+                    await smtp.send_message(message)
+                self.sent += 1
+                return smtp, True
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                # Permanent for this message, the connection is still fine
+                logger.error(f"Email to {message['To']} refused: {e}")
+                break
+            except (aiosmtplib.SMTPException, OSError) as e:
+                logger.warning(f"Sending email to {message['To']} failed (attempt {attempt + 1}): {e}")
+                await self._close(smtp)
+                smtp = None
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+        self.failed += 1
+        return smtp, False
+
+    async def _worker(self):
+        smtp = None
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                for message, result in batch:
+                    sent = False
+                    try:
+                        smtp, sent = await self._send(smtp, message)
+                    finally:
+                        if result is not None and not result.done():
+                            result.set_result(sent)
+                        self._queue.task_done()
+        finally:
+            await self._close(smtp)
+
+dispatcher = MailDispatcher(
+    pool_size=settings.MAIL_POOL_SIZE,
+    queue_size=settings.MAIL_QUEUE_SIZE,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_retries=settings.MAIL_MAX_RETRIES
 )
 
-fastmail = FastMail(conf)
+def build_message(recipient: str, subject: str, html: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.MAIL_FROM
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(html, subtype="html")
+    return message
 
-async def send_verification_email(user: UserDB, token: str):
+def verification_message(recipient: str, username: str, token: str) -> EmailMessage:
     verify_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
 
-    message = MessageSchema(
-        subject="Account verification",
-        recipients=[user.email],
-        template_body={
-            "username": user.username,
-            "url": verify_url
-        },
-        subtype=MessageType.html
-    )
+    html = get_template("verify_email.html").render(username=username, url=verify_url)
+    return build_message(recipient, "Account verification", html)
 
-    await fastmail.send_message(message, template_name="verify_email.html")
-
-async def send_password_reset_email(user: UserDB, token: str):
+def password_reset_message(recipient: str, username: str, token: str) -> EmailMessage:
     reset_url = f"{settings.FRONTEND_URL}/reset-password?token={token}"
 
-    message = MessageSchema(
-        subject="Recover your password",
-        recipients=[user.email],
-        template_body={
-            "username": user.username,
-            "url": reset_url
-        },
-        subtype=MessageType.html
-    )
+    html = get_template("reset_password.html").render(username=username, url=reset_url)
+    return build_message(recipient, "Recover your password", html)
+
+# Outbox kind -> message builder
+message_builders = {
+    EmailKind.VERIFY_EMAIL: verification_message,
+    EmailKind.RESET_PASSWORD: password_reset_message,
+}
 
-    await fastmail.send_message(message, template_name="reset_password.html")
\ No newline at end of file
+def outbox_message(row: EmailOutbox) -> EmailMessage:
+    return message_builders[EmailKind(row.kind)](row.recipient, row.payload["username"], row.payload["token"])
@@ -12,6 +12,14 @@ def register_exception_handlers(app: FastAPI):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    @app.exception_handler(exceptions.InvalidRefreshToken)
+    async def invalid_refresh_token_handler(request: Request, exc: exceptions.InvalidRefreshToken):
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"detail": exc.message},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     # Not Found Error (404)
     @app.exception_handler(exceptions.UserNotFound)
     async def user_not_found_handler(request: Request, exc: exceptions.UserNotFound):
@@ -20,6 +28,14 @@ def register_exception_handlers(app: FastAPI):
             content={"detail": exc.message},
         )
     
+    # Forbidden Error (403)
+    @app.exception_handler(exceptions.NotEnoughPermissions)
+    async def not_enough_permissions_handler(request: Request, exc: exceptions.NotEnoughPermissions):
+        return JSONResponse(
+            status_code=status.HTTP_403_FORBIDDEN,
+            content={"detail": exc.message},
+        )
+    
     # Bad request Error (400)
     @app.exception_handler(exceptions.InvalidToken)
     async def iInvalid_token_handler(request: Request, exc: exceptions.InvalidToken):
@@ -63,6 +79,32 @@ def register_exception_handlers(app: FastAPI):
             content={"detail": exc.message},
         )
     
+    # Precondition Failed (412)
+    @app.exception_handler(exceptions.PreconditionFailed)
+    async def precondition_failed_handler(request: Request, exc: exceptions.PreconditionFailed):
+        return JSONResponse(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            content={"detail": exc.message},
+        )
+    
+    # Too Many Requests (429)
+    @app.exception_handler(exceptions.TooManyAttempts)
+    async def too_many_attempts_handler(request: Request, exc: exceptions.TooManyAttempts):
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"detail": exc.message},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    
+    # Service Unavailable (503)
+    @app.exception_handler(exceptions.ServiceOverloaded)
+    async def service_overloaded_handler(request: Request, exc: exceptions.ServiceOverloaded):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": exc.message},
+            headers={"Retry-After": "1"},
+        )
+    
     @app.exception_handler(exceptions.AppError)
     async def app_error_handler(request: Request, exc: exceptions.AppError):
         return JSONResponse(
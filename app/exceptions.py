@@ -7,6 +7,10 @@ class InvalidToken(AppError):
     def __init__(self, message: str = "Invalid or expired reset token"):
         super().__init__(message)
 
+class InvalidRefreshToken(AppError):
+    def __init__(self, message: str = "Invalid or expired refresh token"):
+        super().__init__(message)
+
 class IncorrectCredentials(AppError):
     def __init__(self, message = "Incorrect username or password"):
         super().__init__(message)
@@ -33,4 +37,31 @@ class UserAlreadyExists(AppError):
 
 class UserNotFound(AppError):
     def __init__(self, message = "User does not exists"):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+class InvalidCursor(AppError):
+    def __init__(self, message: str = "Invalid pagination cursor"):
+        super().__init__(message)
+
+class NotEnoughPermissions(AppError):
+    def __init__(self, message: str = "Not enough permissions"):
+        super().__init__(message)
+
+class PreconditionFailed(AppError):
+    def __init__(self, message: str = "The resource has been modified, fetch it again"):
+        super().__init__(message)
+
+class TooManyAttempts(AppError):
+    def __init__(self, message: str = "Too many attempts, please try again later", retry_after: int = 1):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class ServiceOverloaded(AppError):
+    def __init__(self, message: str = "Server is busy, please try again later"):
+        super().__init__(message)
+
+class HashingOverloaded(ServiceOverloaded):
+    pass
+
+class MailQueueFull(ServiceOverloaded):
+    pass
\ No newline at end of file
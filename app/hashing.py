@@ -0,0 +1,80 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app import exceptions
+from app.config import settings
+
+# Worker functions (must be importable top-level functions to be picklable)
+def hash_password(plain_password: str) -> str:
+    from app.security import password_hash
+    return password_hash.hash(plain_password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    from app.security import password_hash
+    return password_hash.verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    from app.security import password_hash
+    return password_hash.verify_and_update(plain_password, hashed_password)
+
+class HashingExecutor:
+    """Run Argon2 hashing in a process pool with a bounded number of pending jobs.
+
+    With ``max_workers=0`` the work runs inline, which is handy for scripts and
+    debugging but blocks the caller.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max(max_workers, 1) * 4
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self._pool is None and self.max_workers > 0:
+            # Use spawn so workers never inherit the event loop or open DB connections
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise exceptions.HashingOverloaded()
+
+        self._pending += 1
+        try:
+            if self.max_workers == 0:
+                return fn(*args)
+            self.start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, plain_password: str) -> str:
+        return await self._submit(hash_password, plain_password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._submit(verify_and_update_password, plain_password, hashed_password)
+
+executor = HashingExecutor(
+    max_workers=settings.HASHING_WORKERS,
+    max_pending=settings.HASHING_MAX_PENDING
+)
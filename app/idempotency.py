@@ -0,0 +1,125 @@
+"""Idempotency-Key support for retried POST requests.
+
+A request to one of IDEMPOTENT_PATHS with an ``Idempotency-Key`` header runs
+once; its response is kept for IDEMPOTENCY_TTL_SECONDS (at most
+IDEMPOTENCY_MAX_KEYS of them) and replayed to retries with the same key
+without running the route again, so no second hash, write or email. A
+duplicate arriving while the first is still in flight waits for it.
+
+Keys are scoped to the path and the caller's Authorization header, and bound
+to the request they first came with: reusing one for a different request is
+rejected with 422. Server errors (5xx) and 429 are not stored, a retry runs
+the request again. The store is per process, like the other caches.
+"""
+
+import asyncio
+import hashlib
+import json
+
+from starlette.routing import Match
+
+from app.cache import TTLCache
+from app.config import settings
+from app.metrics import idempotent_replays
+
+IDEMPOTENT_PATHS = {"/auth/register", "/auth/forgot-password", "/user/resend-verification"}
+
+# Larger responses are not stored (every stored one is a small JSON document)
+MAX_STORED_BODY = 64 * 1024
+MAX_KEY_LENGTH = 255
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+        # (Authorization digest, path, key) -> (request fingerprint, status, headers, body)
+        self.responses = TTLCache(maxsize=settings.IDEMPOTENCY_MAX_KEYS, ttl=settings.IDEMPOTENCY_TTL_SECONDS)
+        self.in_flight: dict[tuple, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_PATHS:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key")
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await send_json(send, 400, {"detail": "Invalid Idempotency-Key"})
+
+        body = await read_body(receive)
+        fingerprint = hashlib.sha256(scope["query_string"] + b"\0" + body).hexdigest()
+        owner = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()
+        store_key = (owner, scope["path"], key)
+
+        while True:
+            stored = self.responses.get(store_key)
+            if stored is not None:
+                if stored[0] != fingerprint:
+                    return await send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+                idempotent_replays.inc(scope["path"])
+                # Label the replay with its route in the request metrics
+                scope["route"] = match_route(scope)
+                return await replay(send, *stored[1:])
+
+            event = self.in_flight.get(store_key)
+            if event is None:
+                break
+            # Same key in flight: wait for its response instead of running the request twice
+            await event.wait()
+
+        self.in_flight[store_key] = event = asyncio.Event()
+        try:
+            await self.run(scope, body, receive, send, store_key, fingerprint)
+        finally:
+            del self.in_flight[store_key]
+            event.set()
+
+    async def run(self, scope, body: bytes, receive, send, store_key: tuple, fingerprint: str):
+        response = {"status": 500, "headers": [], "body": b""}
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # The body was read already, what comes next is the disconnect
+            return await receive()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+            await send(message)
+
+        await self.app(scope, receive_body, send_wrapper)
+
+        status = response["status"]
+        if status < 500 and status != 429 and len(response["body"]) <= MAX_STORED_BODY:
+            self.responses.set(store_key, (fingerprint, status, response["headers"], response["body"]))
+
+def match_route(scope):
+    for route in scope["app"].router.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            return route
+    return None
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def replay(send, status: int, headers: list, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": headers + [(b"idempotent-replayed", b"true")]})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json(send, status: int, content: dict):
+    body = json.dumps(content).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,138 @@
+"""Asymmetric keys for signing access tokens (RS256 / EdDSA).
+
+Every ``<kid>.pem`` file in JWT_KEYS_DIR is a key, the file name is its kid.
+Private keys can sign, public keys only verify (retired signers). All of them
+are published on /.well-known/jwks.json so other services can verify tokens
+without calling this API.
+
+Rollover: add the new private key to the directory. It is published right
+away but only used for signing once it is JWT_KEY_ACTIVATION_SECONDS old, so
+consumers have time to refresh their JWKS. The previous key keeps verifying
+the tokens it signed; retire it to a public key once those have expired.
+
+The publish time is kept in a ``<kid>.json`` sidecar ({"published_at": unix
+time}) written by jwt_keys.py; a key without one uses its file's modification
+time.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from app.config import settings
+
+@dataclass
+class JWTKey:
+    kid: str
+    algorithm: str
+    public_key: Any
+    private_key: Any | None
+    # When the key was published (sidecar, else file modification time)
+    published_at: float
+    # SHA-256 of the PEM file, a rewritten file is parsed again
+    fingerprint: str
+
+    def jwk(self) -> dict:
+        if self.algorithm == "EdDSA":
+            jwk = OKPAlgorithm.to_jwk(self.public_key, as_dict=True)
+        else:
+            jwk = RSAAlgorithm.to_jwk(self.public_key, as_dict=True)
+        return {**jwk, "kid": self.kid, "alg": self.algorithm, "use": "sig"}
+
+def published_path(path: Path) -> Path:
+    return path.with_suffix(".json")
+
+def read_published_at(path: Path) -> float:
+    try:
+        return float(json.loads(published_path(path).read_text())["published_at"])
+    except FileNotFoundError:
+        return path.stat().st_mtime
+
+def load_key(path: Path, data: bytes | None = None) -> JWTKey:
+    data = path.read_bytes() if data is None else data
+    try:
+        private_key = serialization.load_pem_private_key(data, password=None)
+        public_key = private_key.public_key()
+    except ValueError:
+        private_key = None
+        public_key = serialization.load_pem_public_key(data)
+
+    if isinstance(public_key, rsa.RSAPublicKey):
+        algorithm = "RS256"
+    elif isinstance(public_key, ed25519.Ed25519PublicKey):
+        algorithm = "EdDSA"
+    else:
+        raise ValueError(f"{path}: only RSA and Ed25519 keys are supported")
+
+    return JWTKey(path.stem, algorithm, public_key, private_key, read_published_at(path), hashlib.sha256(data).hexdigest())
+
+class KeyRing:
+    """Parsed keys of a directory, rescanned at most every ``reload_interval`` seconds.
+
+    Files are read at every rescan but only parsed again when their content
+    changes: a retired key loses its private part even if its file kept the
+    same size and modification time.
+    """
+
+    def __init__(self, directory: str, activation_delay: float = 3600, reload_interval: float = 60, signing_kid: str | None = None):
+        self.directory = Path(directory)
+        self.activation_delay = activation_delay
+        self.reload_interval = reload_interval
+        self.signing_kid = signing_kid
+        self._keys: dict[str, JWTKey] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            keys = {}
+            for path in sorted(self.directory.glob("*.pem")):
+                data = path.read_bytes()
+                cached = self._keys.get(path.stem)
+                if cached is not None and cached.fingerprint == hashlib.sha256(data).hexdigest():
+                    cached.published_at = read_published_at(path)
+                    keys[path.stem] = cached
+                else:
+                    keys[path.stem] = load_key(path, data)
+
+            if not any(key.private_key for key in keys.values()):
+                raise RuntimeError(f"No private key in {self.directory}")
+
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+
+    def keys(self) -> dict[str, JWTKey]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            self.load()
+        return self._keys
+
+    def get(self, kid: str | None) -> JWTKey | None:
+        return self.keys().get(kid)
+
+    def signing_key(self) -> JWTKey:
+        keys = self.keys()
+        if self.signing_kid:
+            return keys[self.signing_kid]
+
+        private_keys = sorted((key for key in keys.values() if key.private_key), key=lambda key: key.published_at)
+        active = [key for key in private_keys if key.published_at + self.activation_delay <= time.time()]
+        # Newest key that has been published long enough, else the oldest one we have
+        return active[-1] if active else private_keys[0]
+
+    def jwks(self) -> dict:
+        return {"keys": [key.jwk() for key in self.keys().values()]}
+
+keyring = KeyRing(
+    settings.JWT_KEYS_DIR,
+    activation_delay=settings.JWT_KEY_ACTIVATION_SECONDS,
+    reload_interval=settings.JWT_KEYS_RELOAD_SECONDS,
+    signing_kid=settings.JWT_SIGNING_KID
+) if settings.JWT_KEYS_DIR else None
@@ -1,20 +1,51 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import create_db_and_table
+from app.database import create_db_and_table, init_engines, dispose_engines
+from app import database, hashing, migrations, revocation
+from app.keys import keyring
 from app.config import settings
-from app.api import auth, user
+from app.api import auth, user, admin, jwks, metrics
+from app.metrics import MetricsMiddleware
+from app.idempotency import IdempotencyMiddleware
 from app.exception_handlers import register_exception_handlers
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("System is starting up...")
-    create_db_and_table()
+    # Runs in each worker after the fork, so every worker gets its own pool
+    init_engines()
+    # Only a version check when the schema is current, no DDL
+    version = migrations.current_version(database.engine)
+    if version < migrations.LATEST_VERSION:
+        if not settings.MIGRATE_ON_STARTUP:
+            raise RuntimeError(
+                f"Database schema is at version {version}, expected {migrations.LATEST_VERSION}: run python create_db.py"
+            )
+        create_db_and_table()
+    if keyring is not None:
+        keyring.load()
+    hashing.executor.start()
+    # Before serving, a token revoked on another worker must not pass here
+    await asyncio.to_thread(revocation.revocations.sync)
+    revocation_sync = asyncio.create_task(revocation.sync_loop())
+    sweeper = None
+    if settings.MAINTENANCE_ENABLED:
+        from app.maintenance import run_sweeper
+        sweeper = asyncio.create_task(run_sweeper())
 
     yield
 
     print("System is shutting down...")
+    for task in filter(None, (revocation_sync, sweeper)):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # In-flight requests are drained by the server before this runs
+    hashing.executor.shutdown()
+    await dispose_engines()
 
 app = FastAPI(
     title="User Authentication System",
@@ -26,6 +57,10 @@ app = FastAPI(
 # Register all exception handlers
 register_exception_handlers(app)
 
+# Innermost: replays get fresh CORS headers and are timed by the metrics middleware
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +70,9 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -46,4 +84,8 @@ async def health_check():
 
 # Include the APIRouters
 app.include_router(auth.router)
-app.include_router(user.router)
\ No newline at end of file
+app.include_router(user.router)
+app.include_router(admin.router)
+app.include_router(jwks.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app import crud, database
+from app.config import settings
+from app.metrics import maintenance_rows
+
+logger = logging.getLogger(__name__)
+
+def tasks() -> dict:
+    """Cleanup tasks by name, each a function of (session, limit) handling one batch"""
+
+    now = datetime.now(timezone.utc)
+    selected = {"expired_reset_tokens": crud.clear_expired_reset_tokens}
+    if settings.UNVERIFIED_ACCOUNT_RETENTION_DAYS:
+        created_before = now - timedelta(days=settings.UNVERIFIED_ACCOUNT_RETENTION_DAYS)
+        selected["unverified_users"] = lambda session, limit: crud.delete_unverified_users(session, created_before, limit)
+    expired_before = now - timedelta(days=settings.REFRESH_TOKEN_RETENTION_DAYS)
+    selected["expired_refresh_tokens"] = lambda session, limit: crud.delete_expired_refresh_tokens(session, expired_before, limit)
+    selected["expired_revocations"] = crud.delete_expired_revocations
+    selected["dead_emails"] = lambda session, limit: crud.delete_dead_emails(session, settings.OUTBOX_MAX_ATTEMPTS, limit)
+    return selected
+
+def run_batch(task, limit: int) -> int:
+    # Always the primary, with a short transaction per batch
+    with Session(database.engine) as session:
+        return task(session, limit)
+
+async def sweep(batch_size: int | None = None, pause: float | None = None) -> dict[str, int]:
+    """Run every task in batches until nothing is left. Returns the rows processed per task.
+
+    Batches run in a thread so a sweep inside the server never blocks the event
+    loop, and the pause between them leaves the write lock to requests.
+    """
+
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    pause = settings.MAINTENANCE_BATCH_PAUSE_SECONDS if pause is None else pause
+
+    report = {}
+    for name, task in tasks().items():
+        started = time.perf_counter()
+        total = batches = 0
+        while True:
+            count = await asyncio.to_thread(run_batch, task, batch_size)
+            total += count
+            batches += 1
+            if count < batch_size:
+                break
+            await asyncio.sleep(pause)
+
+        report[name] = total
+        maintenance_rows.inc(name, amount=total)
+        logger.info(f"{name}: {total} rows in {batches} batches, {time.perf_counter() - started:.1f}s")
+    return report
+
+async def run_sweeper(stopping: asyncio.Event | None = None):
+    """Sweep every MAINTENANCE_INTERVAL_SECONDS until ``stopping`` is set (or the task is cancelled)"""
+
+    stopping = stopping or asyncio.Event()
+    while not stopping.is_set():
+        try:
+            await sweep()
+        except Exception:
+            # A failed sweep is retried at the next interval
+            logger.exception("Maintenance sweep failed")
+        try:
+            await asyncio.wait_for(stopping.wait(), settings.MAINTENANCE_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,184 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts keyed by label values, guarded by a
+lock (SQL events can fire from threadpool threads). Gauges are read from
+callbacks at scrape time, so nothing is sampled between scrapes.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# Seconds, from a cached user lookup to a slow Argon2 verify
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in values]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # label values -> [count per bucket (+Inf last), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        lines = self.header()
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class Gauge(Metric):
+    """Value read from ``callback`` at scrape time, a dict maps label values to values.
+
+    ``kind="counter"`` exposes a counter that is kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float | dict | None], labels: tuple[str, ...] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+        self.kind = kind
+
+    def collect(self) -> list[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        values = value if isinstance(value, dict) else {(): value}
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, key if isinstance(key, tuple) else (key,))} {v}"
+            for key, v in values.items()
+        ]
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = (), kind: str = "gauge"):
+        """Decorator registering a function as a gauge callback"""
+
+        def decorator(callback):
+            self.register(Gauge(name, documentation, callback, labels, kind))
+            return callback
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+))
+# Stages: hash_password, verify_password, sql, jwt_encode, jwt_decode, email_send
+stage_duration = registry.register(Histogram(
+    "app_stage_duration_seconds", "Time spent in each stage of request handling", ("stage",)
+))
+
+maintenance_rows = registry.register(Counter(
+    "maintenance_rows_total", "Rows cleaned up by the maintenance sweeper", ("task",)
+))
+
+idempotent_replays = registry.register(Counter(
+    "idempotent_replays_total", "Responses replayed for a repeated Idempotency-Key", ("path",)
+))
+
+class MetricsMiddleware:
+    """Count and time requests, labelled with the route template to keep cardinality low"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], path)
+            http_requests.inc(scope["method"], path, status)
@@ -0,0 +1,133 @@
+"""Versioned schema migrations.
+
+The ``schema_version`` table records every applied migration. Server startup
+only reads the current version (one query) and runs no DDL when the schema is
+up to date. Migrations are applied by ``python create_db.py``, by serve.py
+before the workers start, or by the lifespan when MIGRATE_ON_STARTUP is set.
+
+Each migration inspects the schema before changing it, so databases created
+by the old create_all on startup are adopted without errors.
+"""
+
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import SQLModel
+
+from app import models  # registers the tables on SQLModel.metadata
+from app.security import hash_token
+
+# Kept outside SQLModel.metadata so create_all never touches it
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def create_tables(conn: Connection):
+    SQLModel.metadata.create_all(conn)
+
+def add_token_version(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns(models.UserDB.__tablename__)}
+    if "token_version" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+def add_expiry_indexes(conn: Connection):
+    # Used by the maintenance sweeper to find expired rows without a table scan
+    for table, column in ((models.UserDB.__table__, "reset_token_expires"), (models.RefreshToken.__table__, "expires_at")):
+        for index in table.indexes:
+            if column in index.columns:
+                index.create(conn, checkfirst=True)
+
+def create_revoked_tokens(conn: Connection):
+    models.RevokedToken.__table__.create(conn, checkfirst=True)
+
+# (old plaintext column, digest column)
+TOKEN_COLUMNS = [
+    ("verification_token", "verification_token_hash"),
+    ("reset_token", "reset_token_hash"),
+]
+TOKEN_BATCH_SIZE = 1000
+
+def hash_one_time_tokens(conn: Connection):
+    """Move plaintext verification/reset tokens to digest columns with unique indexes.
+
+    The old columns are left in place (but emptied), SQLite before 3.35 has no
+    DROP COLUMN.
+    """
+
+    table = models.UserDB.__table__
+    columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+
+    for old, new in TOKEN_COLUMNS:
+        if new not in columns:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {new} VARCHAR(64)"))
+        if old not in columns:
+            continue
+
+        # Batches keep the memory flat, each one empties the rows it read
+        while True:
+            rows = conn.execute(
+                text(f"SELECT id, {old} FROM {table.name} WHERE {old} IS NOT NULL LIMIT :limit"),
+                {"limit": TOKEN_BATCH_SIZE}
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                text(f"UPDATE {table.name} SET {new} = :digest, {old} = NULL WHERE id = :id"),
+                [{"id": row[0], "digest": hash_token(row[1])} for row in rows]
+            )
+
+    # After the conversion, so the unique indexes are built once
+    digest_columns = {new for _, new in TOKEN_COLUMNS}
+    for index in table.indexes:
+        if digest_columns & {column.name for column in index.columns}:
+            index.create(conn, checkfirst=True)
+
+def add_is_admin(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns(models.UserDB.__tablename__)}
+    if "is_admin" not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT false"))
+
+# (version, description, migration), append only
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create tables", create_tables),
+    (2, "users.token_version", add_token_version),
+    (3, "expiry indexes", add_expiry_indexes),
+    (4, "revoked_tokens", create_revoked_tokens),
+    (5, "hashed one-time tokens", hash_one_time_tokens),
+    (6, "users.is_admin", add_is_admin),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(engine: Engine) -> int:
+    """Version of the database schema, 0 for an empty database"""
+
+    with engine.connect() as conn:
+        try:
+            return conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).scalar() or 0
+        except (OperationalError, ProgrammingError):
+            # No schema_version table yet
+            return 0
+
+def migrate(engine: Engine) -> list[int]:
+    """Apply pending migrations, each in its own transaction. Returns the applied versions"""
+
+    schema_version.create(engine, checkfirst=True)
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version(engine):
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.now(timezone.utc)
+            ))
+        applied.append(version)
+    return applied
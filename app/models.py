@@ -1,6 +1,10 @@
 from datetime import datetime
+from enum import Enum
 from pydantic import EmailStr, field_validator
-from sqlmodel import SQLModel, Field, func
+from sqlalchemy import false
+from sqlmodel import SQLModel, Field, JSON, func
+
+from app.config import settings
 
 # BASE MODELS
 class UserBase(SQLModel):
@@ -11,14 +15,21 @@ class UserBase(SQLModel):
 # TABLE MODELS
 class UserDB(UserBase, table=True):
     __tablename__: str = "users"
+    # Fetch server generated columns with RETURNING instead of a refresh SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id: int | None = Field(default=None, primary_key=True, index=True)
     hashed_password: str = Field(nullable=False)
     is_active: bool = Field(default=True)
     is_verified: bool = Field(default=False)
-    verification_token: str | None = Field(default=None)
-    reset_token: str | None = Field(default=None)
-    reset_token_expires: datetime | None = Field(default=None)
+    # Access to the /admin routes, granted with python make_admin.py
+    is_admin: bool = Field(default=False, sa_column_kwargs={"server_default": false()})
+    # Bumped to invalidate stateless access tokens issued before
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Only a SHA-256 digest of each token is stored (xem security.hash_token)
+    verification_token_hash: str | None = Field(default=None, unique=True, index=True, max_length=64)
+    reset_token_hash: str | None = Field(default=None, unique=True, index=True, max_length=64)
+    reset_token_expires: datetime | None = Field(default=None, index=True)
 
     # Sử dụng sa_column để dùng các tính năng đặc biệt của SQLAlchemy
     created_at: datetime = Field(
@@ -33,6 +44,59 @@ class UserDB(UserBase, table=True):
         }
     )
 
+class RefreshToken(SQLModel, table=True):
+    """Opaque refresh token (stored as a digest). Rotation keeps every token of a login in one family"""
+
+    __tablename__: str = "refresh_tokens"
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id", index=True, nullable=False, ondelete="CASCADE")
+    token_hash: str = Field(unique=True, index=True, max_length=64, nullable=False)
+    family_id: str = Field(index=True, max_length=32, nullable=False)
+    expires_at: datetime = Field(nullable=False, index=True)
+    revoked_at: datetime | None = Field(default=None)
+
+    created_at: datetime = Field(
+        default=None,
+        sa_column_kwargs={"server_default": func.now()}
+    )
+
+class RevokedToken(SQLModel, table=True):
+    """Access token revoked before its expiry (logout), kept until it would have expired"""
+
+    __tablename__: str = "revoked_tokens"
+
+    id: int | None = Field(default=None, primary_key=True)
+    jti: str = Field(unique=True, max_length=32, nullable=False)
+    user_id: int | None = Field(default=None)
+    expires_at: datetime = Field(nullable=False, index=True)
+    revoked_at: datetime = Field(nullable=False, index=True)
+
+class EmailKind(str, Enum):
+    VERIFY_EMAIL = "verify_email"
+    RESET_PASSWORD = "reset_password"
+
+class EmailOutbox(SQLModel, table=True):
+    """Emails waiting to be sent, written in the same transaction as the change that triggers them"""
+
+    __tablename__: str = "email_outbox"
+
+    id: int | None = Field(default=None, primary_key=True)
+    kind: str = Field(nullable=False)
+    recipient: str = Field(nullable=False)
+    payload: dict = Field(default_factory=dict, sa_type=JSON)
+    attempts: int = Field(default=0)
+    last_error: str | None = Field(default=None)
+
+    # Lease: a worker owns the row until locked_until, failed rows wait there before a retry
+    locked_by: str | None = Field(default=None, index=True)
+    locked_until: datetime | None = Field(default=None, index=True)
+
+    created_at: datetime = Field(
+        default=None,
+        sa_column_kwargs={"server_default": func.now()}
+    )
+
 # ACTION SCHEMAS (Cho request/response)
 class UserCreate(UserBase):
     password: str = Field(min_length=8)
@@ -50,6 +114,10 @@ class UserResponse(UserBase):
     is_verified: bool
     created_at: datetime
 
+class UserPage(SQLModel):
+    items: list[UserResponse]
+    next_cursor: str | None = None
+
 class UserUpdate(SQLModel): # Không kế thừa Base vì các trường này đều là Optional
     username: str | None = None
     email: EmailStr | None = None
@@ -58,10 +126,41 @@ class UserUpdate(SQLModel): # Không kế thừa Base vì các trường này đ
 class Token(SQLModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
     message: str | None = None
 
+class RefreshRequest(SQLModel):
+    refresh_token: str
+
+class IntrospectRequest(SQLModel):
+    tokens: list[str] = Field(min_length=1, max_length=settings.INTROSPECT_MAX_TOKENS)
+
+class TokenIntrospection(SQLModel):
+    # Valid, unexpired, not revoked, and its user exists, is active and has the same token version
+    active: bool
+    username: str | None = None
+    user_id: int | None = None
+    verified: bool | None = None
+    exp: int | None = None
+    claims: dict | None = None
+
+class IntrospectResponse(SQLModel):
+    # In the order of the request
+    results: list[TokenIntrospection]
+
+class LogoutRequest(SQLModel):
+    # Also revoke the refresh token (and its family) of this session
+    refresh_token: str | None = None
+
 class TokenData(SQLModel):
     username: str | None = None
+    user_id: int | None = None
+    is_active: bool | None = None
+    is_verified: bool | None = None
+    is_admin: bool | None = None
+    token_version: int | None = None
+    jti: str | None = None
+    expires_at: datetime | None = None
 
 class ChangePasswordRequest(SQLModel):
     current_password: str
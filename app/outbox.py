@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from sqlmodel import Session
+
+from app import crud, email
+from app.config import settings
+from app import database
+
+logger = logging.getLogger(__name__)
+
+async def drain_once(worker_id: str) -> int:
+    """Claim one batch from the outbox and send it. Returns the number of claimed emails"""
+
+    with Session(database.engine, expire_on_commit=False) as session:
+        rows = crud.claim_emails(
+            session,
+            worker_id,
+            limit=settings.OUTBOX_BATCH_SIZE,
+            lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+        )
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(
+            *(email.dispatcher.deliver(email.outbox_message(row)) for row in rows),
+            return_exceptions=True
+        )
+
+        sent, failed = [], []
+        for row, result in zip(rows, results):
+            if result is True:
+                sent.append(row)
+            else:
+                failed.append((row, str(result) if isinstance(result, Exception) else "SMTP send failed"))
+
+        lost = crud.finish_emails(
+            session,
+            sent,
+            failed,
+            retry_seconds=settings.OUTBOX_RETRY_SECONDS,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+        )
+
+    if failed:
+        logger.warning(f"{len(failed)} of {len(rows)} outbox emails failed, will retry")
+    if lost:
+        logger.warning(f"Lease of {lost} outbox emails expired before they were sent, another worker owns them now")
+    return len(rows)
+
+async def run_worker():
+    """Drain the outbox until SIGINT/SIGTERM"""
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    logger.info(f"Outbox worker {worker_id} started")
+    email.dispatcher.start()
+    try:
+        while not stopping.is_set():
+            if await drain_once(worker_id) == 0:
+                try:
+                    await asyncio.wait_for(stopping.wait(), settings.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        await email.dispatcher.stop()
+        logger.info(f"Outbox worker {worker_id} stopped")
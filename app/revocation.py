@@ -0,0 +1,120 @@
+"""Revoked access tokens, checked on every request without I/O.
+
+Each worker keeps the jti of every revoked, unexpired token in a Bloom filter
+and an exact dict. A token whose jti is not in the filter (almost always) is
+accepted after a few hash probes; a filter hit is confirmed against the dict.
+Both are refreshed from the revoked_tokens table every REVOCATION_SYNC_SECONDS,
+so a logout reaches the other workers within that delay.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app import database
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows are read again for this long after a sync, a transaction may commit late
+SYNC_OVERLAP = timedelta(seconds=60)
+# Expired entries are dropped (and the filter rebuilt) this often
+REBUILD_INTERVAL = timedelta(hours=1)
+
+class BloomFilter:
+    """Set membership with false positives at about ``error_rate`` up to ``capacity`` items"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        # Double hashing: k positions from two 64 bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RevocationList:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._expires: dict[str, datetime] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_at: datetime | None = None
+        self._rebuilt_at = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        return jti in self._expires
+
+    def add(self, jti: str, expires_at: datetime):
+        with self._lock:
+            self._expires[jti] = expires_at
+            self._bloom.add(jti)
+
+    def _rebuild(self):
+        # Bloom filters cannot forget: drop expired entries by building a new one
+        now = datetime.now(timezone.utc)
+        self._expires = {jti: expires for jti, expires in self._expires.items() if expires > now}
+        bloom = BloomFilter(max(self.capacity, len(self._expires) * 2), self.error_rate)
+        for jti in self._expires:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._rebuilt_at = now
+
+    def sync(self) -> int:
+        """Load revocations recorded since the last sync (all of them the first time). Returns the new entries"""
+
+        from app import crud  # crud imports security, which imports this module
+
+        started = datetime.now(timezone.utc)
+        since = self._synced_at - SYNC_OVERLAP if self._synced_at else None
+        with Session(database.engine) as session:
+            rows = crud.get_revoked_tokens(session, since)
+
+        with self._lock:
+            added = 0
+            for jti, expires_at in rows:
+                if jti not in self._expires:
+                    # Naive datetimes come back from SQLite, they are UTC
+                    self._expires[jti] = expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+                    self._bloom.add(jti)
+                    added += 1
+
+            if started - self._rebuilt_at > REBUILD_INTERVAL or len(self._expires) > self._bloom.capacity:
+                self._rebuild()
+            self._synced_at = started
+        return added
+
+revocations = RevocationList(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+
+async def sync_loop():
+    """Refresh ``revocations`` every REVOCATION_SYNC_SECONDS until cancelled"""
+
+    while True:
+        await asyncio.sleep(settings.REVOCATION_SYNC_SECONDS)
+        try:
+            await asyncio.to_thread(revocations.sync)
+        except Exception:
+            # Keep the last list, the next sync retries
+            logger.exception("Revocation list sync failed")
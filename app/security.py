@@ -1,13 +1,25 @@
+import hashlib
+import secrets
 import jwt
 from datetime import datetime, timedelta, timezone
 from jwt.exceptions import InvalidTokenError
 from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
 
-from app import models
+from app import models, hashing
+from app.metrics import stage_duration
+from app.keys import keyring
+from app.revocation import revocations
 from app.config import settings
 
-# PasswordHashing
-password_hash = PasswordHash.recommended()
+# PasswordHashing, hashes made with other parameters still verify and are upgraded on login
+password_hash = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM
+    ),
+))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return password_hash.verify(plain_password, hashed_password)
@@ -15,6 +27,25 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(plain_password: str) -> str:
     return password_hash.hash(plain_password)
 
+def is_known_hash(hashed_password: str) -> bool:
+    """Whether one of the configured hashers can verify this hash, login fails with an error otherwise"""
+    return any(hasher.identify(hashed_password) for hasher in password_hash.hashers)
+
+# Async variants run in the hashing process pool so the event loop stays free
+# (timings include the wait for a free worker)
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    with stage_duration.time("verify_password"):
+        return await hashing.executor.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(plain_password: str) -> str:
+    with stage_duration.time("hash_password"):
+        return await hashing.executor.hash(plain_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify a password, also returning a new hash if the stored one uses outdated parameters"""
+    with stage_duration.time("verify_password"):
+        return await hashing.executor.verify_and_update(plain_password, hashed_password)
+
 # JWT functions
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -24,26 +55,83 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # jti identifies the token for logout (revocation.py)
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(16)})
 
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    with stage_duration.time("jwt_encode"):
+        if keyring is not None:
+            key = keyring.signing_key()
+            return jwt.encode(to_encode, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
 
-def verify_token(token: str):
+        encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+        return encoded_jwt
+
+def decode_token(token: str) -> dict:
+    with stage_duration.time("jwt_decode"):
+        return _decode_token(token)
+
+def _decode_token(token: str) -> dict:
+    if keyring is None:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+    # The kid picks the key, its algorithm is fixed by the key type, not by the token
+    key = keyring.get(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise InvalidTokenError("Unknown signing key")
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+def user_claims(user: models.UserDB) -> dict:
+    """Claims that let dependencies authorise a request without loading the user"""
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "active": user.is_active,
+        "verified": user.is_verified,
+        "admin": user.is_admin,
+        "tv": user.token_version,
+    }
+
+def verify_claims(token: str) -> dict | None:
+    """Claims of a valid, unexpired and not revoked access token"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return models.TokenData(username)
+        payload = decode_token(token)
     except InvalidTokenError:
         return None
+    if payload.get("sub") is None:
+        return None
+    jti = payload.get("jti")
+    if jti is not None and revocations.is_revoked(jti):
+        return None
+    return payload
+
+def verify_token(token: str):
+    payload = verify_claims(token)
+    if payload is None:
+        return None
+    return models.TokenData(
+        username=payload["sub"],
+        user_id=payload.get("uid"),
+        is_active=payload.get("active"),
+        is_verified=payload.get("verified"),
+        is_admin=payload.get("admin"),
+        token_version=payload.get("tv"),
+        jti=payload.get("jti"),
+        expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc) if "exp" in payload else None
+    )
     
 # Token generation helpers
+def hash_token(token: str) -> str:
+    """Fixed-length digest used to store and look up one-time tokens"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def create_verification_token() -> str:
     import secrets
     return secrets.token_urlsafe(32)
 
 def create_reset_token() -> str:
+    import secrets
+    return secrets.token_urlsafe(32)
+
+def create_refresh_token() -> str:
     import secrets
     return secrets.token_urlsafe(32)
\ No newline at end of file
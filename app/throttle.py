@@ -0,0 +1,244 @@
+"""Attempt throttling for the unauthenticated endpoints that cost CPU or email.
+
+Attempts are counted per key (client IP, username, email) over a sliding
+window. Once a key reaches its limit it is locked out for
+THROTTLE_LOCKOUT_SECONDS; login failures for an account also back off
+exponentially before that. Attempts are counted before any password
+hashing, and the count returned by the backend decides whether an attempt
+goes through, so concurrent requests cannot all slip past the limit.
+
+Counters live in a ThrottleBackend: in process memory by default, or any
+shared store (THROTTLE_BACKEND="package.module:factory") so all workers see
+the same counts.
+"""
+
+import abc
+import importlib
+import math
+import time
+from collections import OrderedDict
+
+from app import exceptions
+from app.config import settings
+
+class ThrottleBackend(abc.ABC):
+    """Storage for counters and locks. Values expire ``ttl`` seconds after being created"""
+
+    @abc.abstractmethod
+    async def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        """Add ``amount`` to a counter atomically, returns the new value (never below 0)"""
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> float | None:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: float, ttl: float):
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+class MemoryBackend(ThrottleBackend):
+    """Per process counters, the oldest keys are dropped beyond ``maxsize``"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def _get(self, key: str) -> float | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return item[1]
+
+    def _set(self, key: str, expires: float, value: float):
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        value = self._get(key)
+        if value is None:
+            # A release after the counter expired starts it at 0, not below
+            self._set(key, time.monotonic() + ttl, max(amount, 0))
+            return max(amount, 0)
+        value = max(value + amount, 0)
+        self._data[key] = (self._data[key][0], value)
+        return int(value)
+
+    async def get(self, key: str) -> float | None:
+        return self._get(key)
+
+    async def set(self, key: str, value: float, ttl: float):
+        self._set(key, time.monotonic() + ttl, value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+class RedisBackend(ThrottleBackend):
+    """Shared counters in a Redis compatible store.
+
+    ``client`` is any asyncio client with ``incrby``, ``expire``, ``get``,
+    ``set(key, value, px=...)`` and ``delete``, e.g. ``redis.asyncio.Redis``.
+    """
+
+    def __init__(self, client, prefix: str = "throttle:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        value = await self.client.incrby(self.prefix + key, amount)
+        if value == amount:
+            await self.client.expire(self.prefix + key, math.ceil(ttl))
+        if value < 0:
+            # INCRBY goes below 0 on a missing or expired key: add the difference back
+            value = await self.client.incrby(self.prefix + key, -value)
+        return value
+
+    async def get(self, key: str) -> float | None:
+        value = await self.client.get(self.prefix + key)
+        return float(value) if value is not None else None
+
+    async def set(self, key: str, value: float, ttl: float):
+        await self.client.set(self.prefix + key, value, px=math.ceil(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*(self.prefix + key for key in keys))
+
+def load_backend(spec: str) -> ThrottleBackend:
+    """``memory`` or ``package.module:factory`` returning a ThrottleBackend"""
+
+    if spec == "memory":
+        return MemoryBackend()
+    module, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module), factory)()
+
+class Throttle:
+    def __init__(
+        self,
+        backend: ThrottleBackend,
+        name: str,
+        limit: int,
+        window: float,
+        lockout: float,
+        backoff_after: int | None = None,
+        backoff_base: float = 1.0,
+        enabled: bool = True
+    ):
+        self.backend = backend
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.lockout = lockout
+        self.backoff_after = backoff_after
+        self.backoff_base = backoff_base
+        self.enabled = enabled
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key.lower()}"
+
+    async def check(self, *keys: str | None):
+        """Raise TooManyAttempts if any of the keys is locked"""
+
+        if not self.enabled:
+            return
+        now = time.time()
+        for key in filter(None, keys):
+            locked_until = await self.backend.get(f"{self._key(key)}:lock")
+            if locked_until is not None and locked_until > now:
+                raise exceptions.TooManyAttempts(retry_after=math.ceil(locked_until - now))
+
+    async def hit(self, *keys: str | None, now: float | None = None):
+        """Count an attempt, lock the keys that went over their limit.
+
+        The attempt that goes over the limit is rejected with TooManyAttempts,
+        so requests that passed ``check`` together are still stopped at the
+        limit: the backend counts them one by one.
+        """
+
+        if not self.enabled:
+            return
+        now = now or time.time()
+        for key in filter(None, keys):
+            attempts = await self._count(self._key(key), now)
+            if attempts > self.limit:
+                await self.backend.set(f"{self._key(key)}:lock", now + self.lockout, self.lockout)
+                raise exceptions.TooManyAttempts(retry_after=math.ceil(self.lockout))
+            if self.backoff_after is not None and attempts > self.backoff_after:
+                delay = min(self.backoff_base * 2 ** (attempts - self.backoff_after - 1), self.lockout)
+                await self.backend.set(f"{self._key(key)}:lock", now + delay, delay)
+
+    async def attempt(self, *keys: str | None):
+        await self.check(*keys)
+        await self.hit(*keys)
+
+    async def release(self, *keys: str | None, counted_at: float):
+        """Give back an attempt counted by ``hit(now=counted_at)``"""
+
+        if not self.enabled:
+            return
+        bucket = int(counted_at // self.window)
+        for key in filter(None, keys):
+            await self.backend.incr(f"{self._key(key)}:{bucket}", ttl=2 * self.window, amount=-1)
+
+    async def reset(self, *keys: str | None):
+        if not self.enabled:
+            return
+        bucket = int(time.time() // self.window)
+        for key in filter(None, keys):
+            key = self._key(key)
+            await self.backend.delete(f"{key}:lock", f"{key}:{bucket}", f"{key}:{bucket - 1}")
+
+    async def _count(self, key: str, now: float) -> float:
+        # Sliding window approximated from the current and previous fixed windows
+        bucket = int(now // self.window)
+        current = await self.backend.incr(f"{key}:{bucket}", ttl=2 * self.window)
+        previous = await self.backend.get(f"{key}:{bucket - 1}") or 0
+        return previous * (1 - (now % self.window) / self.window) + current
+
+backend = load_backend(settings.THROTTLE_BACKEND)
+
+def throttle(name: str, limit: int, **kwargs) -> Throttle:
+    return Throttle(
+        backend,
+        name,
+        limit,
+        window=settings.THROTTLE_WINDOW_SECONDS,
+        lockout=settings.THROTTLE_LOCKOUT_SECONDS,
+        enabled=settings.THROTTLE_ENABLED,
+        **kwargs
+    )
+
+# Login failures per client IP and per username / email
+login_ip = throttle("login:ip", settings.THROTTLE_LOGIN_IP_LIMIT)
+login_account = throttle(
+    "login:account",
+    settings.THROTTLE_LOGIN_ACCOUNT_LIMIT,
+    backoff_after=settings.THROTTLE_BACKOFF_AFTER,
+    backoff_base=settings.THROTTLE_BACKOFF_BASE_SECONDS
+)
+# Every attempt counts: registration hashes a password, forgot-password sends an email
+register = throttle("register", settings.THROTTLE_REGISTER_LIMIT)
+forgot_password = throttle("forgot-password", settings.THROTTLE_FORGOT_PASSWORD_LIMIT)
+
+async def login_attempt(ip: str | None, username: str) -> float:
+    """Count a login attempt before the password is hashed, returns when it was counted"""
+
+    now = time.time()
+    await login_ip.check(ip)
+    await login_account.check(username)
+    await login_ip.hit(ip, now=now)
+    await login_account.hit(username, now=now)
+    return now
+
+async def login_succeeded(ip: str | None, username: str, counted_at: float):
+    # Only failures count: the IP gets its attempt back, the account starts over
+    await login_ip.release(ip, counted_at=counted_at)
+    await login_account.reset(username)
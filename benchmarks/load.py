@@ -0,0 +1,249 @@
+"""Load and latency benchmark for the auth API.
+
+Drives ``app.main:app`` against a temporary SQLite database, either in-process
+over ASGI or through a uvicorn server, and reports throughput and p50/p95/p99
+latency per scenario. Results can be saved as JSON and compared against a
+stored baseline; the run exits non-zero on errors or regressions.
+
+    python -m benchmarks.load --concurrency 8 --requests 200 --output results.json
+    python -m benchmarks.load --transport uvicorn --baseline benchmarks/baseline.json
+
+Throttling is disabled for the run, the login failure scenario would trip it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+SCENARIOS = ["register", "login", "login_failure", "me", "me_not_modified", "update_me", "verify_email", "reset_password"]
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+class Fixtures:
+    """Users and one-time tokens written straight to the database before the run"""
+
+    def __init__(self, count: int):
+        from sqlmodel import Session
+        from app import database, models
+        from app.security import get_password_hash, hash_token
+
+        self.password = "benchmark-password"
+        # ETag of the bench user's profile, set before the me_not_modified scenario
+        self.etag = None
+        hashed_password = get_password_hash(self.password)
+        self.verify_tokens = [secrets.token_urlsafe(32) for _ in range(count)]
+        self.reset_tokens = [secrets.token_urlsafe(32) for _ in range(count)]
+        expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+        users = [models.UserDB(
+            username="bench", email="bench@example.com", hashed_password=hashed_password, is_verified=True
+        )]
+        for i, token in enumerate(self.verify_tokens):
+            users.append(models.UserDB(
+                username=f"verify{i}", email=f"verify{i}@example.com",
+                hashed_password=hashed_password, verification_token_hash=hash_token(token)
+            ))
+        for i, token in enumerate(self.reset_tokens):
+            users.append(models.UserDB(
+                username=f"reset{i}", email=f"reset{i}@example.com",
+                hashed_password=hashed_password, reset_token_hash=hash_token(token), reset_token_expires=expires
+            ))
+
+        database.create_db_and_table()
+        with Session(database.engine) as session:
+            session.add_all(users)
+            session.commit()
+
+def scenario_request(name: str, i: int, fixtures: Fixtures, headers: dict) -> tuple[str, str, dict, int]:
+    """Method, url, request kwargs and expected status of request ``i`` of a scenario"""
+
+    password = fixtures.password
+    if name == "register":
+        body = {"username": f"new{i}", "email": f"new{i}@example.com", "password": password, "password_confirm": password}
+        return "POST", "/auth/register", {"json": body}, 201
+    if name == "login":
+        return "POST", "/auth/login", {"data": {"username": "bench", "password": password}}, 200
+    if name == "login_failure":
+        return "POST", "/auth/login", {"data": {"username": "bench", "password": "wrong-password"}}, 401
+    if name == "me":
+        return "GET", "/user/me", {"headers": headers}, 200
+    if name == "me_not_modified":
+        return "GET", "/user/me", {"headers": {**headers, "If-None-Match": fixtures.etag}}, 304
+    if name == "update_me":
+        return "PATCH", "/user/me", {"headers": headers, "json": {"full_name": f"Bench {i}"}}, 200
+    if name == "verify_email":
+        return "GET", "/auth/verify-email", {"params": {"token": fixtures.verify_tokens[i]}}, 200
+    if name == "reset_password":
+        new_password = f"{password}-{i}"
+        body = {"token": fixtures.reset_tokens[i], "new_password": new_password, "confirm_password": new_password}
+        return "POST", "/auth/reset-password", {"json": body}, 200
+    raise ValueError(name)
+
+async def run_scenario(client, name: str, requests: int, concurrency: int, fixtures: Fixtures, headers: dict) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs, expected = scenario_request(name, i, fixtures, headers)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != expected:
+                errors += 1
+                if errors == 1:
+                    print(f"  {name}: unexpected {response.status_code} {response.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+async def run_all(client, args, fixtures: Fixtures) -> dict:
+    response = await client.post("/auth/login", data={"username": "bench", "password": fixtures.password})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    results = {}
+    for name in args.scenarios:
+        # Keep the connections open between scenarios
+        await client.get("/health")
+        if name == "me_not_modified":
+            fixtures.etag = (await client.get("/user/me", headers=headers)).headers["ETag"]
+        results[name] = await run_scenario(client, name, args.requests, args.concurrency, fixtures, headers)
+        print_result(name, results[name])
+    return results
+
+async def run_asgi(args, fixtures: Fixtures) -> dict:
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_all(client, args, fixtures)
+
+async def run_uvicorn(args, fixtures: Fixtures) -> dict:
+    import httpx
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log", "--workers", str(args.workers)],
+        env=os.environ.copy()
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            for _ in range(300):
+                try:
+                    await client.get("/health")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            return await run_all(client, args, fixtures)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<16} {result['throughput']:>9.1f} req/s  p50 {result['p50_ms']:>8.1f}  "
+        f"p95 {result['p95_ms']:>8.1f}  p99 {result['p99_ms']:>8.1f} ms  errors {result['errors']}"
+    )
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenarios whose p95 rose or throughput fell by more than ``tolerance``"""
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']} -> {result['throughput']} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use sqlite+aiosqlite")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a results JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    driver = "sqlite+aiosqlite" if args.use_async else "sqlite"
+    os.environ["DATABASE_URL"] = f"{driver}:///{tmp}/load.db"
+    os.environ["THROTTLE_ENABLED"] = "false"
+
+    fixtures = Fixtures(args.requests)
+    run = run_uvicorn if args.transport == "uvicorn" else run_asgi
+    results = asyncio.run(run(args, fixtures))
+
+    report = {
+        "meta": {
+            "transport": args.transport,
+            "database": driver,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "requests": args.requests,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = any(result["errors"] for result in results.values())
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("transport", "database", "concurrency", "workers", "cpu_count"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                print(f"Warning: baseline {key} is {baseline['meta'].get(key)}, this run {report['meta'][key]}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed |= bool(regressions)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""SQLite profile benchmark: the default settings against the tuned profile.
+
+Runs the write heavy load scenarios through uvicorn with several workers,
+once with SQLite defaults (rollback journal, synchronous=FULL, the driver's
+5 s lock timeout, one pool for reads and writes) and once with the SQLITE_*
+profile from the settings, and prints throughput, p95 latency and errors
+side by side.
+
+    python -m benchmarks.sqlite_concurrency --workers 4 --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SCENARIOS = ["register", "login", "me", "update_me", "reset_password"]
+
+# Every pragma left at the SQLite default, no writer/reader split
+BASELINE = {
+    "SQLITE_JOURNAL_MODE": "",
+    "SQLITE_SYNCHRONOUS": "",
+    "SQLITE_BUSY_TIMEOUT_MS": "0",
+    "SQLITE_MMAP_SIZE": "0",
+    "SQLITE_CACHE_SIZE": "0",
+    "SQLITE_SINGLE_WRITER": "false",
+}
+
+# Cheap hashing and no hashing backpressure for both runs
+COMMON = {"ARGON2_TIME_COST": "1", "ARGON2_MEMORY_COST": "1024", "ARGON2_PARALLELISM": "1", "HASHING_MAX_PENDING": "10000"}
+
+def run_profile(args, overrides: dict) -> dict:
+    output = os.path.join(tempfile.mkdtemp(), "results.json")
+    command = [
+        sys.executable, "-m", "benchmarks.load", "--transport", "uvicorn",
+        "--workers", str(args.workers), "--concurrency", str(args.concurrency),
+        "--requests", str(args.requests), "--scenarios", *args.scenarios, "--output", output,
+    ]
+    if args.use_async:
+        command.append("--async")
+    # Non-zero exit on request errors is expected for the baseline, the results file says which
+    subprocess.run(command, env={**os.environ, **COMMON, **overrides})
+    with open(output) as f:
+        return json.load(f)["results"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use sqlite+aiosqlite")
+    args = parser.parse_args()
+
+    print("== SQLite defaults")
+    baseline = run_profile(args, BASELINE)
+    print("== Tuned profile")
+    tuned = run_profile(args, {})
+
+    print()
+    print(f"{'scenario':<16} {'req/s default':>14} {'req/s tuned':>12} {'p95 default':>12} {'p95 tuned':>10} {'errors':>10}")
+    for name in args.scenarios:
+        base, new = baseline[name], tuned[name]
+        print(
+            f"{name:<16} {base['throughput']:>14.1f} {new['throughput']:>12.1f} "
+            f"{base['p95_ms']:>12.1f} {new['p95_ms']:>10.1f} {base['errors']:>4} / {new['errors']:<4}"
+        )
+
+if __name__ == "__main__":
+    main()
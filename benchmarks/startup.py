@@ -0,0 +1,102 @@
+"""Cold start benchmark: from process start to the first request served.
+
+Each run is a fresh interpreter against an already migrated temporary SQLite
+database (a restart, the common case when autoscaling). The in-process mode
+splits the time into importing app.main, the lifespan startup and the first
+request; --uvicorn measures the wall clock from spawning a uvicorn server to
+its first response. Exits non-zero when the median total is over --max-ms.
+
+    python -m benchmarks.startup --runs 5 --max-ms 2000
+    python -m benchmarks.startup --uvicorn
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+CHILD = """
+import asyncio, json, time
+import httpx
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def main():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://startup") as client:
+            response = await client.get("/health")
+            assert response.status_code == 200
+        served = time.perf_counter()
+    return ready, served
+
+ready, served = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "total_ms": (served - started) * 1000,
+}))
+"""
+
+def run_in_process() -> dict:
+    output = subprocess.run([sys.executable, "-c", CHILD], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_uvicorn() -> dict:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return {"total_ms": (time.perf_counter() - started) * 1000}
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--uvicorn", action="store_true", help="Time a uvicorn server instead of an in-process app")
+    parser.add_argument("--max-ms", type=float, help="Fail when the median total is above this")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/startup.db"
+
+    # Migrate once, every measured run is a restart on a current schema
+    subprocess.run([sys.executable, "create_db.py"], check=True, capture_output=True)
+
+    runs = [run_uvicorn() if args.uvicorn else run_in_process() for _ in range(args.runs)]
+
+    for phase in runs[0]:
+        values = [run[phase] for run in runs]
+        print(f"{phase:<18} median {statistics.median(values):8.1f} ms   min {min(values):8.1f}   max {max(values):8.1f}")
+
+    total = statistics.median(run["total_ms"] for run in runs)
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"Startup took {total:.0f} ms, over the {args.max_ms:.0f} ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Token lookup benchmark: hashed + indexed lookup vs a scan on an unindexed column.
+
+Usage: python -m benchmarks.token_lookup [--sizes 10000 100000 1000000] [--lookups 200]
+"""
+
+import argparse
+import os
+import secrets
+import sqlite3
+import tempfile
+import time
+
+from app.security import hash_token
+
+def build_table(path: str, rows: int) -> list[str]:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, plain_token VARCHAR, token_hash VARCHAR(64))"
+    )
+    conn.execute("CREATE UNIQUE INDEX ix_users_token_hash ON users (token_hash)")
+
+    sample = []
+    batch = []
+    for i in range(rows):
+        token = secrets.token_urlsafe(32)
+        batch.append((token, hash_token(token)))
+        if i % max(rows // 200, 1) == 0:
+            sample.append(token)
+        if len(batch) == 10000:
+            conn.executemany("INSERT INTO users (plain_token, token_hash) VALUES (?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO users (plain_token, token_hash) VALUES (?, ?)", batch)
+
+    conn.commit()
+    conn.close()
+    return sample
+
+def time_lookups(path: str, query: str, values: list[str]) -> float:
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    for value in values:
+        assert conn.execute(query, (value,)).fetchone() is not None
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed / len(values) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'hashed+indexed (us)':>20} {'unindexed scan (us)':>20}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            sample = build_table(path, rows)
+            tokens = (sample * (args.lookups // len(sample) + 1))[:args.lookups]
+
+            indexed = time_lookups(
+                path, "SELECT id FROM users WHERE token_hash = ?", [hash_token(t) for t in tokens]
+            )
+            # Scans are slow, a handful of lookups is enough
+            scan = time_lookups(path, "SELECT id FROM users WHERE plain_token = ?", tokens[:10])
+
+        print(f"{rows:>10} {indexed:>20.1f} {scan:>20.1f}")
+
+if __name__ == "__main__":
+    main()
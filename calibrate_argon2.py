@@ -0,0 +1,101 @@
+"""Pick Argon2 parameters for this host.
+
+Measures how long a batch of ``--concurrency`` simultaneous verifications
+takes on a process pool sized like the app's hashing pool, then chooses the
+most expensive parameters whose worst case latency stays under ``--target-ms``.
+Memory per hash is capped by ``--memory-budget-mib / --concurrency``.
+
+Usage: python calibrate_argon2.py [--target-ms 250] [--concurrency 8] [--write .env]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from argon2 import PasswordHasher
+
+MIN_MEMORY_KIB = 19 * 1024  # OWASP minimum for Argon2id
+MAX_TIME_COST = 10
+
+def hash_once(time_cost: int, memory_cost: int, parallelism: int) -> float:
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    started = time.perf_counter()
+    hasher.hash("calibration-password")
+    return time.perf_counter() - started
+
+def batch_latency(pool: ProcessPoolExecutor, concurrency: int, params: tuple[int, int, int], rounds: int = 3) -> float:
+    """Median time for ``concurrency`` simultaneous hashes, i.e. the slowest request of a burst"""
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        list(pool.map(hash_once, *zip(*[params] * concurrency)))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def calibrate(target: float, concurrency: int, memory_budget_kib: int, workers: int) -> tuple[tuple[int, int, int], float]:
+    # The pool already runs one hash per core, extra lanes only help when cores are idle
+    parallelism = max(1, min(4, workers // concurrency))
+
+    memory_cost = MIN_MEMORY_KIB
+    while memory_cost * 2 <= memory_budget_kib // concurrency:
+        memory_cost *= 2
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(hash_once, 1, 8, 1).result()  # start the workers
+
+        while True:
+            best = None
+            for time_cost in range(1, MAX_TIME_COST + 1):
+                params = (time_cost, memory_cost, parallelism)
+                latency = batch_latency(pool, concurrency, params)
+                print(f"  t={time_cost:<2} m={memory_cost // 1024:>4} MiB p={parallelism}  {latency * 1000:8.1f} ms")
+                if latency > target:
+                    break
+                best = (params, latency)
+
+            if best or memory_cost <= MIN_MEMORY_KIB:
+                return best or ((1, memory_cost, parallelism), latency)
+            memory_cost //= 2
+
+def write_env(path: Path, params: tuple[int, int, int]):
+    values = dict(zip(("ARGON2_TIME_COST", "ARGON2_MEMORY_COST", "ARGON2_PARALLELISM"), params))
+    text = path.read_text() if path.exists() else ""
+    for key, value in values.items():
+        line = f"{key}={value}"
+        text, count = re.subn(rf"^#?\s*{key}=.*$", line, text, flags=re.MULTILINE)
+        if not count:
+            text += ("" if not text or text.endswith("\n") else "\n") + line + "\n"
+    path.write_text(text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250, help="Worst case verify latency for a burst")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="Simultaneous logins to plan for")
+    parser.add_argument("--memory-budget-mib", type=int, default=1024, help="Memory all concurrent hashes may use together")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("HASHING_WORKERS") or 0) or os.cpu_count() or 1)
+    parser.add_argument("--write", type=Path, help="Store the result in this env file (e.g. .env)")
+    args = parser.parse_args()
+
+    print(f"Calibrating for {args.concurrency} concurrent verifies on {args.workers} workers, target {args.target_ms:.0f} ms")
+    params, latency = calibrate(args.target_ms / 1000, args.concurrency, args.memory_budget_mib * 1024, args.workers)
+    time_cost, memory_cost, parallelism = params
+
+    print(f"\nARGON2_TIME_COST={time_cost}")
+    print(f"ARGON2_MEMORY_COST={memory_cost}")
+    print(f"ARGON2_PARALLELISM={parallelism}")
+    print(f"Burst latency {latency * 1000:.0f} ms, about {args.concurrency / latency:.1f} logins/s")
+    if latency > args.target_ms / 1000:
+        print("Warning: the minimum parameters are slower than the target on this host")
+
+    if args.write:
+        write_env(args.write, params)
+        print(f"Written to {args.write}, existing hashes are upgraded on the next login")
+
+if __name__ == "__main__":
+    main()
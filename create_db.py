@@ -1,6 +1,16 @@
-from app.database import create_db_and_table
+import sys
+
+from app import database, migrations
 
 if __name__ == "__main__":
-    print("Creating database...")
-    create_db_and_table()
-    print("Done!")
\ No newline at end of file
+    database.init_engines()
+    version = migrations.current_version(database.engine)
+    print(f"Schema version {version}, latest {migrations.LATEST_VERSION}")
+
+    # --check: exit 1 when migrations are pending, without changing anything
+    if "--check" in sys.argv:
+        sys.exit(0 if version >= migrations.LATEST_VERSION else 1)
+
+    print("Migrating database...")
+    applied = database.create_db_and_table()
+    print(f"Done! Applied {applied or 'nothing'}")
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""Bulk import users from a CSV or NDJSON file.
+
+Each record needs ``username``, ``email`` and either ``password`` (hashed here across
+a process pool) or ``hashed_password`` (stored as is, it must be a valid Argon2 hash);
+``full_name`` is optional.
+Plaintext passwords must pass the same checks as registration. Invalid records and
+duplicates inside the file or against existing users are written to a reject file,
+without their passwords.
+
+Usage: python import_users.py users.csv [--rejects rejects.ndjson] [--batch-size 5000]
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import database
+from app.hashing import hash_password
+from app.models import UserBase, UserCreate, UserDB
+from app.security import is_known_hash
+
+def read_records(path: Path, fmt: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+# Never written to the reject file
+SECRET_FIELDS = ("password", "password_confirm", "hashed_password")
+
+def load_existing(conn) -> tuple[set[str], set[str]]:
+    usernames, emails = set(), set()
+    result = conn.execution_options(yield_per=10000).execute(select(UserDB.username, UserDB.email))
+    for username, email in result:
+        usernames.add(username)
+        emails.add(email.lower())
+    return usernames, emails
+
+class Importer:
+    def __init__(self, rejects, pool: ProcessPoolExecutor | None, workers: int, verified: bool, batch_size: int):
+        self.rejects = rejects
+        self.pool = pool
+        self.workers = workers
+        self.verified = verified
+        self.batch_size = batch_size
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+        with database.engine.connect() as conn:
+            self.usernames, self.emails = load_existing(conn)
+
+    def reject(self, record: dict, reason: str):
+        self.rejected += 1
+        public = {key: value for key, value in record.items() if key not in SECRET_FIELDS}
+        self.rejects.write(json.dumps({**public, "reason": reason}, default=str) + "\n")
+
+    def validate(self, record: dict) -> dict | None:
+        if not record.get("password") and not record.get("hashed_password"):
+            self.reject(record, "missing password")
+            return None
+
+        try:
+            if record.get("hashed_password"):
+                user = UserBase.model_validate(record)
+            else:
+                # Plaintext passwords get the same rules as POST /auth/register
+                user = UserCreate.model_validate({**record, "password_confirm": record["password"]})
+        except ValidationError as e:
+            error = e.errors()[0]
+            self.reject(record, f"invalid {'.'.join(map(str, error['loc']))}: {error['msg']}")
+            return None
+        # A bcrypt or malformed hash could never be verified at login
+        if record.get("hashed_password") and not is_known_hash(record["hashed_password"]):
+            self.reject(record, "invalid hashed_password: not an Argon2 hash")
+            return None
+
+        email = user.email.lower()
+        if user.username in self.usernames:
+            self.reject(record, "username already taken")
+            return None
+        if email in self.emails:
+            self.reject(record, "email already registered")
+            return None
+
+        self.usernames.add(user.username)
+        self.emails.add(email)
+        return {
+            "username": user.username,
+            "email": user.email,
+            "full_name": user.full_name,
+            "hashed_password": record.get("hashed_password"),
+            "password": record.get("password"),
+            "is_active": True,
+            "is_verified": self.verified,
+        }
+
+    def hash_passwords(self, rows: list[dict]):
+        pending = [row for row in rows if not row["hashed_password"]]
+        passwords = [row["password"] for row in pending]
+
+        if self.pool is None:
+            hashes = map(hash_password, passwords)
+        else:
+            chunksize = max(len(passwords) // (self.workers * 4), 1)
+            hashes = self.pool.map(hash_password, passwords, chunksize=chunksize)
+
+        for row, hashed in zip(pending, hashes):
+            row["hashed_password"] = hashed
+        for row in rows:
+            del row["password"]
+
+    def insert(self, rows: list[dict]):
+        statement = insert(UserDB.__table__)
+        try:
+            with database.engine.begin() as conn:
+                conn.execute(statement, rows)
+            self.imported += len(rows)
+        except IntegrityError:
+            # Someone else inserted a conflicting row meanwhile, retry one by one
+            for row in rows:
+                try:
+                    with database.engine.begin() as conn:
+                        conn.execute(statement, row)
+                    self.imported += 1
+                except IntegrityError:
+                    self.reject(row, "conflict on insert")
+
+    def flush(self, rows: list[dict]):
+        if rows:
+            self.hash_passwords(rows)
+            self.insert(rows)
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = time.perf_counter() - self.started
+        rate = self.imported / elapsed if elapsed else 0
+        print(
+            f"{'Done' if final else 'Progress'}: {self.imported} imported, "
+            f"{self.rejected} rejected, {rate:.0f} users/s",
+            file=sys.stderr
+        )
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            row = self.validate(record)
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        self.report(final=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", type=Path)
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Default: guessed from the file extension")
+    parser.add_argument("--rejects", type=Path, default=Path("rejects.ndjson"))
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing processes, 0 = hash inline")
+    parser.add_argument("--verified", action="store_true", help="Mark imported users as verified")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.input.suffix.lower() == ".csv" else "ndjson")
+
+    database.create_db_and_table()
+
+    pool = None
+    if args.workers:
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    try:
+        with open(args.rejects, "w", encoding="utf-8") as rejects:
+            importer = Importer(rejects, pool, args.workers, args.verified, args.batch_size)
+            importer.run(read_records(args.input, fmt))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Manage the access token signing keys in JWT_KEYS_DIR.
+
+Rollover:
+    python jwt_keys.py generate            # new key, signs after JWT_KEY_ACTIVATION_SECONDS
+    python jwt_keys.py retire <old kid>    # once tokens signed by it have expired
+    python jwt_keys.py remove <old kid>    # once nobody needs to verify them anymore
+
+Usage: python jwt_keys.py {generate,retire,remove,list} [--dir keys]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+from app.keys import load_key, published_path
+
+def write_published_at(path: Path, published_at: float):
+    tmp = path.with_name(f"{path.stem}.json.tmp")
+    tmp.write_text(json.dumps({"published_at": published_at}))
+    tmp.replace(published_path(path))
+
+def generate(directory: Path, kid: str | None, key_type: str):
+    kid = kid or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    path = directory / f"{kid}.pem"
+    if path.exists():
+        raise SystemExit(f"{path} already exists")
+
+    if key_type == "rsa":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    write_published_at(path, time.time())
+    print(f"Created {path}")
+
+def retire(directory: Path, kid: str):
+    """Keep only the public part, the key still verifies but no longer signs"""
+
+    path = directory / f"{kid}.pem"
+    key = load_key(path)
+    if key.private_key is None:
+        raise SystemExit(f"{kid} is already retired")
+
+    # Keep the publish time, it decides which key signs (keys without a sidecar
+    # take it from the modification time, which the rewrite changes)
+    write_published_at(path, key.published_at)
+    pem = key.public_key.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(pem)
+    tmp.replace(path)
+    print(f"Retired {kid}")
+
+def remove(directory: Path, kid: str):
+    path = directory / f"{kid}.pem"
+    path.unlink()
+    published_path(path).unlink(missing_ok=True)
+    print(f"Removed {kid}")
+
+def list_keys(directory: Path):
+    for path in sorted(directory.glob("*.pem")):
+        key = load_key(path)
+        published = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(key.published_at))
+        role = "sign+verify" if key.private_key else "verify"
+        print(f"{key.kid:<20} {key.algorithm:<6} {role:<12} published {published}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["generate", "retire", "remove", "list"])
+    parser.add_argument("kid", nargs="?", help="Key id, defaults to a timestamp for generate")
+    parser.add_argument("--dir", default=os.environ.get("JWT_KEYS_DIR", "keys"))
+    parser.add_argument("--type", choices=["ed25519", "rsa"], default="ed25519", help="Key type for generate")
+    args = parser.parse_args()
+
+    directory = Path(args.dir)
+    if args.command == "generate":
+        generate(directory, args.kid, args.type)
+    elif args.command == "list":
+        list_keys(directory)
+    elif not args.kid:
+        parser.error(f"{args.command} needs a kid")
+    elif args.command == "retire":
+        retire(directory, args.kid)
+    else:
+        remove(directory, args.kid)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import asyncio
+import logging
+
+from app.database import create_db_and_table
+from app.outbox import run_worker
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_table()
+    asyncio.run(run_worker())
@@ -0,0 +1,35 @@
+"""Grant or revoke access to the /admin routes.
+
+    python make_admin.py alice            # by username or email
+    python make_admin.py alice --revoke
+
+The user must also have verified their email. Tokens issued before the change
+stop working, the user logs in again to get the new rights.
+"""
+
+import argparse
+
+from sqlmodel import Session
+
+from app import crud, database, exceptions, migrations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("user", help="Username or email")
+    parser.add_argument("--revoke", action="store_true", help="Remove admin rights")
+    args = parser.parse_args()
+
+    database.init_engines()
+    if migrations.current_version(database.engine) < migrations.LATEST_VERSION:
+        raise SystemExit("Database schema is not up to date: run python create_db.py")
+
+    with Session(database.engine) as session:
+        try:
+            user = crud.set_admin(session, args.user, not args.revoke)
+        except exceptions.UserNotFound:
+            raise SystemExit(f"No user {args.user}")
+
+    print(f"{user.username} is {'no longer' if args.revoke else 'now'} an admin")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Local stand-in for database replication: copy a SQLite primary into replica files.
+
+Snapshots the file of DATABASE_URL into every SQLite file of
+DATABASE_REPLICA_URLS every --interval seconds with the SQLite backup API,
+so the replicas lag the primary the way a real replica does.
+
+    DATABASE_REPLICA_URLS='["sqlite:///./replica.db"]' python replicate_sqlite.py --interval 2
+
+Development only, use the database's own replication in production.
+"""
+
+import argparse
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        raise SystemExit(f"{url} is not a SQLite file")
+    return parsed.database
+
+def replicate(primary: str, replicas: list[str]):
+    source = sqlite3.connect(primary)
+    try:
+        for replica in replicas:
+            target = sqlite3.connect(replica)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between snapshots (the replication lag)")
+    parser.add_argument("--once", action="store_true", help="Copy once and exit")
+    args = parser.parse_args()
+
+    if not settings.DATABASE_REPLICA_URLS:
+        raise SystemExit("DATABASE_REPLICA_URLS is empty")
+    primary = sqlite_path(settings.DATABASE_URL)
+    replicas = [sqlite_path(url) for url in settings.DATABASE_REPLICA_URLS]
+
+    while True:
+        replicate(primary, replicas)
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Production entry point: several uvicorn worker processes sharing one socket.
+
+Migrations run once here, before the workers start. Each worker then
+builds its own engine, pool and hashing pool in the lifespan. See the
+"Running in production" section of the README.
+
+Usage: python serve.py   (configured through SERVER_* settings)
+"""
+
+import os
+
+import uvicorn
+
+from app import database
+from app.config import settings
+
+def main():
+    cpus = os.cpu_count() or 1
+    workers = settings.SERVER_WORKERS or cpus
+
+    database.create_db_and_table()
+    # Nothing from this process's pool may leak into the workers
+    database.engine.dispose()
+    os.environ["MIGRATE_ON_STARTUP"] = "false"
+
+    # Share the cores between the hashing pools of all workers
+    if settings.HASHING_WORKERS is None:
+        os.environ["HASHING_WORKERS"] = str(max(1, cpus // workers))
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        access_log=False
+    )
+
+if __name__ == "__main__":
+    main()
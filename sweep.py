@@ -0,0 +1,41 @@
+"""Delete expired tokens and abandoned unverified accounts.
+
+    python sweep.py                 # one sweep, prints the rows processed per task (cron)
+    python sweep.py --loop          # sweep every MAINTENANCE_INTERVAL_SECONDS until stopped
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from app import database, maintenance, migrations
+
+async def loop():
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stopping.set)
+    await maintenance.run_sweeper(stopping)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loop", action="store_true", help="Keep sweeping at MAINTENANCE_INTERVAL_SECONDS")
+    parser.add_argument("--batch-size", type=int, help="Rows per batch (default MAINTENANCE_BATCH_SIZE)")
+    parser.add_argument("--pause", type=float, help="Seconds between batches (default MAINTENANCE_BATCH_PAUSE_SECONDS)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    database.init_engines()
+    if migrations.current_version(database.engine) < migrations.LATEST_VERSION:
+        raise SystemExit("Database schema is not up to date: run python create_db.py")
+
+    if args.loop:
+        asyncio.run(loop())
+        return
+
+    report = asyncio.run(maintenance.sweep(args.batch_size, args.pause))
+    for name, count in report.items():
+        print(f"{name:<24} {count}")
+
+if __name__ == "__main__":
+    main()
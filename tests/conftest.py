@@ -0,0 +1,128 @@
+"""Shared fixtures.
+
+Tests using the ``app`` fixture run once with the sync SQLite driver and once
+with aiosqlite. The app modules read DATABASE_URL when they are imported, so
+each mode imports its own copy of the ``app`` package; every test then gets an
+empty database file of its own.
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+import types
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.main import default_registry
+
+# Before anything imports app.config: inline and cheap hashing, no background sync
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{tempfile.gettempdir()}/auth-tests.db",
+    "HASHING_WORKERS": "0",
+    "ARGON2_TIME_COST": "1",
+    "ARGON2_MEMORY_COST": "1024",
+    "ARGON2_PARALLELISM": "1",
+    "REVOCATION_SYNC_SECONDS": "3600",
+    "MAINTENANCE_ENABLED": "false",
+})
+
+DRIVERS = ["sqlite", "sqlite+aiosqlite"]
+
+MODULES = [
+    "async_crud", "cache", "config", "crud", "database", "dependencies", "email", "exceptions", "hashing",
+    "keys", "main", "maintenance", "migrations", "models", "outbox", "revocation", "security", "throttle",
+]
+
+PASSWORD = "password1"
+
+def import_app(database_url: str) -> types.SimpleNamespace:
+    os.environ["DATABASE_URL"] = database_url
+    for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+        del sys.modules[name]
+    # The table classes are declared again by the new import
+    SQLModel.metadata.clear()
+    default_registry.dispose()
+
+    modules = {name: importlib.import_module(f"app.{name}") for name in MODULES}
+    return types.SimpleNamespace(**modules, settings=modules["config"].settings)
+
+@pytest.fixture(scope="session", params=DRIVERS)
+def app_modules(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp(request.param.replace("+", "-"))
+    return import_app(f"{request.param}:///{directory}/app.db")
+
+@pytest.fixture
+def app(app_modules, tmp_path, monkeypatch):
+    """The app modules of the current database mode, on an empty database"""
+
+    app = app_modules
+    url = app.database.database_url.set(database=str(tmp_path / "app.db"))
+    monkeypatch.setattr(app.database, "database_url", url)
+
+    for cache in (app.cache.user_cache, app.cache.token_version_cache, app.cache.recently_written, app.cache.introspection_cache):
+        cache.clear()
+    app.throttle.backend._data.clear()
+    return app
+
+@pytest.fixture
+def client(app):
+    with TestClient(app.main.app) as client:
+        yield client
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def register(client):
+    """Register a user, returns the response"""
+
+    def register(username: str, password: str = PASSWORD, **kwargs):
+        json = {"username": username, "email": f"{username}@example.com", "password": password, "password_confirm": password}
+        return client.post("/auth/register", json=json, **kwargs)
+
+    return register
+
+@pytest.fixture
+def login(client, register):
+    """Register a user and log in, returns the token response"""
+
+    def login(username: str, password: str = PASSWORD) -> dict:
+        assert register(username, password).status_code == 201
+        response = client.post("/auth/login", data={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return login
+
+@pytest.fixture
+def last_email_token(app):
+    """Token of the latest email queued in the outbox"""
+
+    def last_email_token() -> str:
+        with Session(app.database.engine) as session:
+            statement = select(app.models.EmailOutbox).order_by(app.models.EmailOutbox.id.desc())
+            return session.exec(statement).first().payload["token"]
+
+    return last_email_token
+
+@pytest.fixture
+def serve(app):
+    """Async context manager running the app (lifespan included) and yielding an httpx client.
+
+    Unlike ``client`` requests run concurrently, and settings changed before
+    entering it apply to the engines and the hashing pool.
+    """
+
+    @asynccontextmanager
+    async def serve():
+        async with app.main.app.router.lifespan_context(app.main.app):
+            transport = httpx.ASGITransport(app=app.main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                yield client
+
+    return serve
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import pytest
+from sqlmodel import Session
+
+from conftest import PASSWORD
+
+@pytest.fixture
+def set_admin(app):
+    def set_admin(username: str, is_admin: bool = True):
+        with Session(app.database.engine, expire_on_commit=False) as session:
+            app.crud.set_admin(session, username, is_admin)
+
+    return set_admin
+
+def bearer(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+def verify(client, last_email_token) -> dict:
+    return client.get("/auth/verify-email", params={"token": last_email_token()}).json()
+
+def test_admin_routes_need_is_admin(client, register, last_email_token):
+    # Being named like an admin grants nothing
+    register("admin")
+    tokens = verify(client, last_email_token)
+    assert client.get("/admin/users", headers=bearer(tokens)).status_code == 403
+
+def test_admin_must_be_verified(client, login, set_admin):
+    login("alice")
+    set_admin("alice")
+    tokens = client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).json()
+    assert client.get("/admin/users", headers=bearer(tokens)).status_code == 400
+
+@pytest.mark.parametrize("stateless", [False, True])
+def test_grant_and_revoke(app, client, register, last_email_token, set_admin, monkeypatch, stateless):
+    monkeypatch.setattr(app.settings, "STATELESS_TOKENS", stateless)
+    register("alice")
+    verify(client, last_email_token)
+
+    set_admin("alice")
+    # Granting invalidated the tokens issued before, a new login carries the right
+    tokens = client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).json()
+    response = client.get("/admin/users", headers=bearer(tokens))
+    assert response.status_code == 200
+    assert [user["username"] for user in response.json()["items"]] == ["alice"]
+
+    set_admin("alice", False)
+    assert client.get("/admin/users", headers=bearer(tokens)).status_code in (401, 403)
+
+# The UserResponse fields of /user/me, the admin routes expose the same ones
+USER_FIELDS = {"id", "username", "email", "full_name", "is_active", "is_verified", "created_at"}
+
+def test_list_and_export_fields(client, register, last_email_token, set_admin):
+    register("alice")
+    verify(client, last_email_token)
+    register("bob")
+    set_admin("alice")
+    headers = bearer(client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).json())
+    me = client.get("/user/me", headers=headers).json()
+    assert set(me) == USER_FIELDS
+
+    first = client.get("/admin/users", headers=headers, params={"limit": 1}).json()
+    assert first["items"] == [me]
+    second = client.get("/admin/users", headers=headers, params={"limit": 1, "cursor": first["next_cursor"]}).json()
+    assert [user["username"] for user in second["items"]] == ["bob"]
+    assert set(second["items"][0]) == USER_FIELDS
+
+    lines = client.get("/admin/users/export", headers=headers).text.splitlines()
+    assert [json.loads(line) for line in lines] == [me, second["items"][0]]
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/admin/users/export", headers=headers, params={"format": "csv"}).text)))
+    assert [row["username"] for row in rows] == ["alice", "bob"]
+    assert set(rows[0]) == USER_FIELDS
@@ -0,0 +1,177 @@
+import sqlite3
+
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+from conftest import PASSWORD
+
+def test_register(register):
+    response = register("alice")
+    assert response.status_code == 201
+    body = response.json()
+    assert body["username"] == "alice"
+    assert body["is_verified"] is False
+    assert "hashed_password" not in body
+
+def test_register_duplicate(client, register):
+    assert register("alice").status_code == 201
+
+    json = {"username": "alice", "email": "other@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+    response = client.post("/auth/register", json=json)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already taken"
+
+    json = {"username": "other", "email": "alice@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+    response = client.post("/auth/register", json=json)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+def test_register_password_mismatch(client):
+    json = {"username": "alice", "email": "alice@example.com", "password": PASSWORD, "password_confirm": "password2"}
+    assert client.post("/auth/register", json=json).status_code == 422
+
+def test_login(client, login):
+    tokens = login("alice")
+    assert tokens["token_type"] == "bearer"
+    assert tokens["refresh_token"]
+
+    # By email too
+    response = client.post("/auth/login", data={"username": "alice@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+
+def test_login_wrong_password(client, register):
+    register("alice")
+    response = client.post("/auth/login", data={"username": "alice", "password": "wrong-password"})
+    assert response.status_code == 401
+
+    response = client.post("/auth/login", data={"username": "nobody", "password": PASSWORD})
+    assert response.status_code == 401
+
+def test_login_rehashes_outdated_hash(app, client, register):
+    register("alice")
+    conn = sqlite3.connect(app.database.database_url.database)
+    hashed_password = lambda: conn.execute("SELECT hashed_password FROM users WHERE username = 'alice'").fetchone()[0]
+
+    # Stored with weaker parameters than the current ones (m=1024, t=1, p=1 in the tests)
+    outdated = Argon2Hasher(time_cost=1, memory_cost=512, parallelism=1).hash(PASSWORD)
+    conn.execute("UPDATE users SET hashed_password = ? WHERE username = 'alice'", (outdated,))
+    conn.commit()
+
+    response = client.post("/auth/login", data={"username": "alice", "password": PASSWORD})
+    assert response.status_code == 200
+    rehashed = hashed_password()
+    assert rehashed != outdated
+    assert "$m=1024,t=1,p=1$" in rehashed
+    assert app.security.verify_password(PASSWORD, rehashed)
+
+    # Current now: kept as it is
+    assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 200
+    assert hashed_password() == rehashed
+    conn.close()
+
+def test_me(client, login):
+    tokens = login("alice")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    response = client.get("/user/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "alice"
+
+    response = client.get("/user/me", headers={**headers, "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+def test_me_requires_token(client):
+    assert client.get("/user/me").status_code == 401
+    assert client.get("/user/me", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+
+def test_update_me(client, login):
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+
+    response = client.patch("/user/me", headers=headers, json={"full_name": "Alice"})
+    assert response.status_code == 200
+    assert client.get("/user/me", headers=headers).json()["full_name"] == "Alice"
+
+    response = client.patch("/user/me", headers={**headers, "If-Match": '"stale"'}, json={"full_name": "Bob"})
+    assert response.status_code == 412
+
+def test_refresh(client, login):
+    tokens = login("alice")
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/user/me", headers={"Authorization": f"Bearer {rotated['access_token']}"}).status_code == 200
+
+def test_refresh_reuse_revokes_family(client, login):
+    tokens = login("alice")
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    # The first token again: both it and the one it was rotated into are revoked
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+
+def test_verify_email(client, register, last_email_token):
+    register("alice")
+
+    response = client.get("/auth/verify-email", params={"token": last_email_token()})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/user/me", headers=headers).json()["is_verified"] is True
+
+    assert client.get("/auth/verify-email", params={"token": "unknown"}).status_code == 404
+
+def test_reset_password(client, register, last_email_token):
+    register("alice")
+    client.post("/auth/forgot-password", params={"user_email": "alice@example.com"})
+
+    json = {"token": last_email_token(), "new_password": "password2", "confirm_password": "password2"}
+    assert client.post("/auth/reset-password", json=json).status_code == 200
+    # One use only
+    assert client.post("/auth/reset-password", json=json).status_code == 400
+
+    assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 401
+    assert client.post("/auth/login", data={"username": "alice", "password": "password2"}).status_code == 200
+
+def test_change_password(client, login):
+    tokens = login("alice")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    json = {"current_password": PASSWORD, "new_password": "password2", "confirm_password": "password2"}
+    assert client.post("/user/change-password", headers=headers, json=json).status_code == 200
+
+    assert client.post("/auth/login", data={"username": "alice", "password": "password2"}).status_code == 200
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+def test_logout(client, login):
+    tokens = login("alice")
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    response = client.post("/auth/logout", headers=headers, json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 204
+    assert client.get("/user/me", headers=headers).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+def test_introspect(app, client, login, monkeypatch):
+    monkeypatch.setattr(app.settings, "INTROSPECT_CLIENTS", {"gateway": "secret"})
+    tokens = [login("alice")["access_token"], "not-a-token"]
+
+    response = client.post("/auth/introspect", json={"tokens": tokens}, auth=("gateway", "secret"))
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["active"] for result in results] == [True, False]
+    assert results[0]["username"] == "alice"
+
+def test_introspect_requires_client(app, client, login, monkeypatch):
+    json = {"tokens": [login("alice")["access_token"]]}
+    # No clients configured: nobody may call it
+    assert client.post("/auth/introspect", json=json).status_code == 401
+    assert client.post("/auth/introspect", json=json, auth=("", "")).status_code == 401
+
+    monkeypatch.setattr(app.settings, "INTROSPECT_CLIENTS", {"gateway": "secret"})
+    for auth in (None, ("gateway", "wrong"), ("other", "secret")):
+        response = client.post("/auth/introspect", json=json, auth=auth)
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Basic"
+    # An end user's own access token is not a client credential
+    headers = {"Authorization": f"Bearer {json['tokens'][0]}"}
+    assert client.post("/auth/introspect", json=json, headers=headers).status_code == 401
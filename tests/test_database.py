@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import create_engine, select, text, update
+
+import replicate_sqlite
+from conftest import PASSWORD
+
+@pytest.fixture
+def replica(app, tmp_path, monkeypatch):
+    """One SQLite replica, only updated when the test calls replicate()"""
+
+    url = app.database.database_url.set(database=str(tmp_path / "replica.db"))
+    monkeypatch.setattr(app.database, "replica_urls", [url])
+    monkeypatch.setattr(app.settings, "DATABASE_REPLICA_URLS", [url.render_as_string()])
+
+    def replicate():
+        replicate_sqlite.replicate(app.database.database_url.database, [url.database])
+
+    return replicate
+
+def login_form(username: str, password: str = PASSWORD) -> dict:
+    return {"username": username, "password": password}
+
+@pytest.mark.anyio
+async def test_sqlite_reader_pool(app, serve):
+    async with serve():
+        writer = app.database.async_engine or app.database.engine
+        reader = (app.database.async_read_engines or app.database.read_engines)[0]
+        assert writer.pool.size() == 1
+        assert reader.pool.size() == app.settings.DB_POOL_SIZE
+
+@pytest.mark.anyio
+async def test_concurrent_logins(app, serve, monkeypatch):
+    # Real hashing processes, so the logins overlap; a starved pool fails fast
+    monkeypatch.setattr(app.hashing.executor, "max_workers", 2)
+    monkeypatch.setattr(app.settings, "DB_POOL_TIMEOUT", 2)
+
+    async with serve() as client:
+        usernames = [f"user{i}" for i in range(4)]
+        for username in usernames:
+            json = {"username": username, "email": f"{username}@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+            assert (await client.post("/auth/register", json=json)).status_code == 201
+
+        responses = await asyncio.gather(*(client.post("/auth/login", data=login_form(username)) for username in usernames))
+        assert [response.status_code for response in responses] == [200] * len(usernames)
+
+@pytest.mark.anyio
+async def test_no_connection_held_while_hashing(app, serve, monkeypatch):
+    # More logins and password changes waiting for a hash than connections in the pools
+    monkeypatch.setattr(app.hashing.executor, "max_workers", 2)
+    monkeypatch.setattr(app.hashing.executor, "max_pending", 100)
+    monkeypatch.setattr(app.settings, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(app.settings, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(app.settings, "DB_POOL_TIMEOUT", 2)
+
+    async with serve() as client:
+        usernames = [f"user{i}" for i in range(8)]
+        for username in usernames:
+            json = {"username": username, "email": f"{username}@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+            assert (await client.post("/auth/register", json=json)).status_code == 201
+
+        headers = []
+        for username in usernames[4:]:
+            token = (await client.post("/auth/login", data=login_form(username))).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+
+        change = {"current_password": PASSWORD, "new_password": "password2", "confirm_password": "password2"}
+        responses = await asyncio.gather(
+            *(client.post("/auth/login", data=login_form(username)) for username in usernames[:4]),
+            *(client.post("/user/change-password", headers=h, json=change) for h in headers)
+        )
+        assert [response.status_code for response in responses] == [200] * len(usernames)
+
+@pytest.mark.anyio
+async def test_session_pinned_after_write(app, replica, serve):
+    UserDB = app.models.UserDB
+
+    async with serve():
+        primary = app.database.async_engine or app.database.engine
+        replica_engine = (app.database.async_read_engines or app.database.read_engines)[0]
+        if app.database.is_async:
+            primary, replica_engine = primary.sync_engine, replica_engine.sync_engine
+
+        session = app.database.RoutingSession()
+        # Only reads marked REPLICA_READ may use the replica
+        assert session.get_bind(clause=select(UserDB)) is primary
+        assert session.get_bind(clause=select(UserDB), **app.database.REPLICA_READ) is replica_engine
+        assert session.get_bind(clause=update(UserDB).values(full_name="x")) is primary
+        # Everything after the write reads the primary, even in a new transaction
+        assert session.get_bind(clause=select(UserDB), **app.database.REPLICA_READ) is primary
+        session.commit()
+        assert session.get_bind(clause=select(UserDB), **app.database.REPLICA_READ) is primary
+
+        session = app.database.RoutingSession()
+        app.database.pin_primary(session)
+        assert session.get_bind(clause=select(UserDB), **app.database.REPLICA_READ) is primary
+
+@pytest.mark.anyio
+async def test_recently_written_user_read_from_primary(app, replica, serve):
+    async with serve() as client:
+        replica()
+        json = {"username": "alice", "email": "alice@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+        assert (await client.post("/auth/register", json=json)).status_code == 201
+
+        # The replica does not have alice yet, the login still finds her on the primary
+        assert (await client.post("/auth/login", data=login_form("alice"))).status_code == 200
+
+        # Once DATABASE_REPLICA_PIN_SECONDS are over, the lagging replica is read
+        app.cache.recently_written.clear()
+        assert (await client.post("/auth/login", data=login_form("alice"))).status_code == 401
+
+        replica()
+        assert (await client.post("/auth/login", data=login_form("alice"))).status_code == 200
+
+def test_failed_query_start_time_dropped(app):
+    engine = create_engine("sqlite://")
+    app.database.time_queries(engine)
+
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert conn.info["query_started"] == []
+
+@pytest.mark.anyio
+async def test_single_use_tokens_read_from_primary(app, replica, serve, last_email_token):
+    async with serve() as client:
+        json = {"username": "alice", "email": "alice@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+        assert (await client.post("/auth/register", json=json)).status_code == 201
+        # The replica has alice, then lags behind every later write
+        replica()
+        app.cache.recently_written.clear()
+
+        tokens = (await client.post("/auth/login", data=login_form("alice"))).json()
+        for _ in range(2):
+            response = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+            assert response.status_code == 200
+            tokens = response.json()
+
+        app.cache.recently_written.clear()
+        assert (await client.post("/auth/forgot-password", params={"user_email": "alice@example.com"})).status_code == 200
+        json = {"token": last_email_token(), "new_password": "password2", "confirm_password": "password2"}
+        assert (await client.post("/auth/reset-password", json=json)).status_code == 200
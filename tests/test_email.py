@@ -0,0 +1,105 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+class Handler:
+    """Accepts every message, refusing the first ``fail_first`` DATA commands with a temporary error"""
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.messages = []
+        self.peers = set()  # one client address per connection
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        self.peers.add(session.peer)
+        if address.startswith("refused@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first:
+            self.fail_first -= 1
+            return "451 Try again later"
+        self.messages.append(envelope)
+        return "250 OK"
+
+@pytest.fixture
+def smtp_server(app, monkeypatch):
+    """Start a local SMTP server, returns a function setting its handler"""
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    monkeypatch.setattr(app.settings, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(app.settings, "MAIL_PORT", port)
+    monkeypatch.setattr(app.settings, "MAIL_STARTTLS", False)
+    monkeypatch.setattr(app.settings, "MAIL_FROM", "noreply@example.com")
+    controllers = []
+
+    def smtp_server(handler: Handler) -> Handler:
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        controllers.append(controller)
+        return handler
+
+    yield smtp_server
+    for controller in controllers:
+        controller.stop()
+
+def message(app, recipient: str):
+    return app.email.build_message(recipient, "Test", "<p>Test</p>")
+
+@pytest.mark.anyio
+async def test_connection_reused(app, smtp_server):
+    handler = smtp_server(Handler())
+    dispatcher = app.email.MailDispatcher(pool_size=1)
+
+    for i in range(3):
+        assert await dispatcher.deliver(message(app, f"user{i}@example.com")) is True
+    await dispatcher.stop()
+
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [[f"user{i}@example.com"] for i in range(3)]
+    assert len(handler.peers) == 1
+    assert (dispatcher.sent, dispatcher.failed) == (3, 0)
+
+@pytest.mark.anyio
+async def test_retry_after_temporary_error(app, smtp_server):
+    handler = smtp_server(Handler(fail_first=2))
+    dispatcher = app.email.MailDispatcher(pool_size=1, max_retries=3, retry_delay=0.01)
+
+    assert await dispatcher.deliver(message(app, "alice@example.com")) is True
+    await dispatcher.stop()
+
+    assert len(handler.messages) == 1
+    # A new connection for every attempt
+    assert len(handler.peers) == 3
+    assert (dispatcher.sent, dispatcher.failed) == (1, 0)
+
+@pytest.mark.anyio
+async def test_gives_up_after_max_retries(app, smtp_server):
+    handler = smtp_server(Handler(fail_first=10))
+    dispatcher = app.email.MailDispatcher(pool_size=1, max_retries=2, retry_delay=0.01)
+
+    assert await dispatcher.deliver(message(app, "alice@example.com")) is False
+    await dispatcher.stop()
+
+    assert handler.messages == []
+    assert len(handler.peers) == 3
+    assert (dispatcher.sent, dispatcher.failed) == (0, 1)
+
+@pytest.mark.anyio
+async def test_refused_recipient_not_retried(app, smtp_server):
+    handler = smtp_server(Handler())
+    dispatcher = app.email.MailDispatcher(pool_size=1, retry_delay=0.01)
+
+    assert await dispatcher.deliver(message(app, "refused@example.com")) is False
+    # The connection is still used for the next message
+    assert await dispatcher.deliver(message(app, "alice@example.com")) is True
+    await dispatcher.stop()
+
+    assert len(handler.messages) == 1
+    assert len(handler.peers) == 1
+    assert (dispatcher.sent, dispatcher.failed) == (1, 1)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+from conftest import PASSWORD
+
+# The stored responses live as long as the app, which the tests share: each test uses keys of its own
+
+def register_json(username: str) -> dict:
+    return {"username": username, "email": f"{username}@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+
+def test_replay(client):
+    headers = {"Idempotency-Key": "replay"}
+    first = client.post("/auth/register", json=register_json("alice"), headers=headers)
+    assert first.status_code == 201
+    assert "idempotent-replayed" not in first.headers
+
+    again = client.post("/auth/register", json=register_json("alice"), headers=headers)
+    assert again.status_code == 201
+    assert again.headers["idempotent-replayed"] == "true"
+    assert again.json() == first.json()
+
+def test_key_reused_for_different_request(client):
+    headers = {"Idempotency-Key": "reused"}
+    assert client.post("/auth/register", json=register_json("alice"), headers=headers).status_code == 201
+
+    response = client.post("/auth/register", json=register_json("bob"), headers=headers)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Idempotency-Key was already used for a different request"
+    assert "idempotent-replayed" not in response.headers
+    # Not run either
+    response = client.post("/auth/login", data={"username": "bob", "password": PASSWORD})
+    assert response.status_code == 401
+
+    # Another key is a new request
+    response = client.post("/auth/register", json=register_json("bob"), headers={"Idempotency-Key": "other"})
+    assert response.status_code == 201
+
+@pytest.mark.anyio
+async def test_concurrent_duplicates(app, serve, monkeypatch):
+    calls = 0
+    get_password_hash_async = app.security.get_password_hash_async
+
+    async def slow_hash(password):
+        nonlocal calls
+        calls += 1
+        # The duplicates arrive while the first request is still in flight
+        await asyncio.sleep(0.2)
+        return await get_password_hash_async(password)
+
+    monkeypatch.setattr(app.security, "get_password_hash_async", slow_hash)
+
+    async with serve() as client:
+        headers = {"Idempotency-Key": "concurrent"}
+        responses = await asyncio.gather(*[
+            client.post("/auth/register", json=register_json("alice"), headers=headers) for _ in range(3)
+        ])
+
+        with Session(app.database.engine) as session:
+            assert len(session.exec(select(app.models.UserDB)).all()) == 1
+            assert len(session.exec(select(app.models.EmailOutbox)).all()) == 1
+
+    assert calls == 1
+    assert [response.status_code for response in responses] == [201] * 3
+    assert sorted(response.headers.get("idempotent-replayed", "") for response in responses) == ["", "true", "true"]
+    assert len({response.text for response in responses}) == 1
@@ -0,0 +1,68 @@
+import importlib
+import io
+import json
+import sys
+
+import pytest
+from sqlmodel import Session, select
+
+from conftest import PASSWORD
+
+@pytest.fixture
+def importer(app, client):
+    # Imported again so it uses the app modules of the current database mode
+    sys.modules.pop("import_users", None)
+    import_users = importlib.import_module("import_users")
+
+    return import_users.Importer(io.StringIO(), pool=None, workers=0, verified=False, batch_size=2)
+
+def rejected_records(importer) -> list[dict]:
+    return [json.loads(line) for line in importer.rejects.getvalue().splitlines()]
+
+def test_import(app, importer):
+    hashed_password = app.security.get_password_hash(PASSWORD)
+    importer.run([
+        {"username": "alice", "email": "alice@example.com", "password": PASSWORD},
+        {"username": "bob", "email": "bob@example.com", "hashed_password": hashed_password, "full_name": "Bob"},
+        {"username": "carol", "email": "carol@example.com", "password": PASSWORD},
+    ])
+    assert (importer.imported, importer.rejected) == (3, 0)
+
+    with Session(app.database.engine) as session:
+        users = {user.username: user for user in session.exec(select(app.models.UserDB))}
+    assert set(users) == {"alice", "bob", "carol"}
+    assert users["bob"].hashed_password == hashed_password
+    assert app.security.verify_password(PASSWORD, users["alice"].hashed_password)
+
+def test_rejects(importer):
+    importer.run([
+        {"username": "alice", "email": "alice@example.com", "password": PASSWORD},
+        {"username": "alice", "email": "other@example.com", "password": PASSWORD},
+        {"username": "short", "email": "short@example.com", "password": "1234567"},
+        {"username": "nopassword", "email": "nopassword@example.com"},
+        {"username": "bademail", "email": "not-an-email", "hashed_password": "$argon2id$secret"},
+    ])
+    assert (importer.imported, importer.rejected) == (1, 4)
+
+    rejected = rejected_records(importer)
+    assert [(record["username"], record["reason"].split(":")[0]) for record in rejected] == [
+        ("alice", "username already taken"),
+        ("short", "invalid password"),
+        ("nopassword", "missing password"),
+        ("bademail", "invalid email"),
+    ]
+    # Secrets never reach the reject file
+    assert not any({"password", "hashed_password"} & record.keys() for record in rejected)
+
+def test_rejects_unknown_hash(app, importer, client):
+    bcrypt = "$2b$12$R9h/cIPz0gi.URNNX3kh2OPST9/PgBkqquzi.Ss7KIUgO2t0jWMUW"
+    importer.run([
+        {"username": "bcrypt", "email": "bcrypt@example.com", "hashed_password": bcrypt},
+        {"username": "malformed", "email": "malformed@example.com", "hashed_password": "$argon2id$secret"},
+    ])
+    assert (importer.imported, importer.rejected) == (0, 2)
+    assert [record["reason"] for record in rejected_records(importer)] == ["invalid hashed_password: not an Argon2 hash"] * 2
+
+    # Never stored, so logging in is a plain 401 rather than an error
+    response = client.post("/auth/login", data={"username": "bcrypt", "password": PASSWORD})
+    assert response.status_code == 401
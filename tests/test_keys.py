@@ -0,0 +1,90 @@
+import importlib
+import sys
+import time
+
+import jwt
+import pytest
+
+@pytest.fixture
+def jwt_keys(app):
+    # Imported again so it uses the app modules of the current database mode
+    sys.modules.pop("jwt_keys", None)
+    return importlib.import_module("jwt_keys")
+
+@pytest.fixture
+def key_dir(tmp_path, jwt_keys):
+    """Two keys: k1 published two hours ago, k2 just now"""
+
+    now = time.time()
+    for kid, published_at in (("k1", now - 7200), ("k2", now)):
+        jwt_keys.generate(tmp_path, kid, "ed25519")
+        jwt_keys.write_published_at(tmp_path / f"{kid}.pem", published_at)
+    return tmp_path
+
+def keyring(app, directory, **kwargs):
+    return app.keys.KeyRing(str(directory), activation_delay=3600, reload_interval=0, **kwargs)
+
+def test_signing_key_waits_for_activation(app, key_dir, jwt_keys):
+    assert keyring(app, key_dir).signing_key().kid == "k1"
+    assert keyring(app, key_dir, signing_kid="k2").signing_key().kid == "k2"
+
+    # k2 has been published long enough
+    jwt_keys.write_published_at(key_dir / "k2.pem", time.time() - 3601)
+    assert keyring(app, key_dir).signing_key().kid == "k2"
+
+def test_only_inactive_keys(app, tmp_path, jwt_keys):
+    jwt_keys.generate(tmp_path, "new", "ed25519")
+    # Better a key consumers may not know yet than no token at all
+    assert keyring(app, tmp_path).signing_key().kid == "new"
+
+def test_retire_reaches_running_keyring(app, key_dir, jwt_keys):
+    ring = keyring(app, key_dir)
+    published_at = ring.get("k1").published_at
+    assert ring.signing_key().kid == "k1"
+
+    jwt_keys.retire(key_dir, "k1")
+    k1 = ring.get("k1")
+    assert k1.private_key is None
+    assert k1.published_at == published_at
+    assert ring.signing_key().kid == "k2"
+
+    jwt_keys.remove(key_dir, "k1")
+    assert ring.get("k1") is None
+    assert not (key_dir / "k1.json").exists()
+
+def test_key_without_sidecar(app, key_dir):
+    (key_dir / "k2.json").unlink()
+    published_at = (key_dir / "k2.pem").stat().st_mtime
+    assert keyring(app, key_dir).get("k2").published_at == published_at
+
+def test_no_private_key(app, key_dir, jwt_keys):
+    for kid in ("k1", "k2"):
+        jwt_keys.retire(key_dir, kid)
+    with pytest.raises(RuntimeError):
+        keyring(app, key_dir).load()
+
+def test_jwks(app, key_dir, jwt_keys, client, monkeypatch):
+    ring = keyring(app, key_dir)
+    jwt_keys.retire(key_dir, "k1")
+    monkeypatch.setattr(importlib.import_module("app.api.jwks"), "keyring", ring)
+
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    keys = {key["kid"]: key for key in response.json()["keys"]}
+    # Retired keys are still published, they verify the tokens they signed
+    assert set(keys) == {"k1", "k2"}
+    for key in keys.values():
+        assert (key["kty"], key["crv"], key["alg"], key["use"]) == ("OKP", "Ed25519", "EdDSA", "sig")
+        assert "d" not in key
+
+def test_tokens_signed_and_verified(app, key_dir, monkeypatch):
+    monkeypatch.setattr(app.security, "keyring", keyring(app, key_dir))
+
+    token = app.security.create_access_token({"sub": "alice"})
+    assert jwt.get_unverified_header(token)["kid"] == "k1"
+    assert app.security.decode_token(token)["sub"] == "alice"
+
+    # A kid that is not in the directory
+    forged = jwt.encode({"sub": "alice"}, "secret", algorithm="HS256", headers={"kid": "k3"})
+    with pytest.raises(jwt.InvalidTokenError):
+        app.security.decode_token(forged)
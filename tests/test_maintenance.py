@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, select, update
+
+NOW = datetime.now(timezone.utc)
+
+@pytest.fixture
+def db(app, client):
+    """Run ``change(session)`` in its own committed transaction"""
+
+    def db(change):
+        with Session(app.database.engine, expire_on_commit=False) as session:
+            result = change(session)
+            session.commit()
+            return result
+
+    return db
+
+def set_user(app, db, username: str, **values):
+    db(lambda session: session.exec(update(app.models.UserDB).where(app.models.UserDB.username == username).values(**values)))
+
+def user_id(app, db, username: str) -> int:
+    return db(lambda session: session.exec(select(app.models.UserDB.id).where(app.models.UserDB.username == username)).one())
+
+def add_revocations(app, db, *expires_at: datetime):
+    db(lambda session: session.add_all(
+        app.models.RevokedToken(jti=f"jti{i}", expires_at=expires, revoked_at=NOW - timedelta(hours=1))
+        for i, expires in enumerate(expires_at)
+    ))
+
+@pytest.mark.anyio
+async def test_sweep_cutoffs(app, db, register):
+    for username in ("alice", "bob", "carol", "dave", "erin"):
+        assert register(username).status_code == 201
+
+    # Reset tokens: expired / still valid
+    set_user(app, db, "alice", reset_token_hash="a" * 64, reset_token_expires=NOW - timedelta(minutes=1))
+    set_user(app, db, "bob", reset_token_hash="b" * 64, reset_token_expires=NOW + timedelta(hours=1))
+    # Unverified for longer than UNVERIFIED_ACCOUNT_RETENTION_DAYS (7) / not yet / verified
+    set_user(app, db, "carol", created_at=NOW - timedelta(days=8))
+    set_user(app, db, "dave", created_at=NOW - timedelta(days=6))
+    set_user(app, db, "erin", created_at=NOW - timedelta(days=8), is_verified=True, verification_token_hash=None)
+
+    # Refresh tokens: expired for longer than REFRESH_TOKEN_RETENTION_DAYS (1) / expired recently / valid
+    alice = user_id(app, db, "alice")
+    db(lambda session: session.add_all(
+        app.models.RefreshToken(user_id=alice, token_hash=str(i) * 64, family_id="family", expires_at=expires)
+        for i, expires in enumerate([NOW - timedelta(days=2), NOW - timedelta(hours=12), NOW + timedelta(days=1)])
+    ))
+    add_revocations(app, db, NOW - timedelta(minutes=1), NOW + timedelta(minutes=10))
+
+    report = await app.maintenance.sweep(batch_size=10, pause=0)
+    assert report == {
+        "expired_reset_tokens": 1,
+        "unverified_users": 1,
+        "expired_refresh_tokens": 1,
+        "expired_revocations": 1,
+        "dead_emails": 0,
+    }
+
+    users = {user.username: user for user in db(lambda session: session.exec(select(app.models.UserDB)).all())}
+    assert sorted(users) == ["alice", "bob", "dave", "erin"]
+    assert (users["alice"].reset_token_hash, users["alice"].reset_token_expires) == (None, None)
+    assert users["bob"].reset_token_hash == "b" * 64
+    assert len(db(lambda session: session.exec(select(app.models.RefreshToken)).all())) == 2
+    assert [row.jti for row in db(lambda session: session.exec(select(app.models.RevokedToken)).all())] == ["jti1"]
+
+    # Nothing left to do
+    assert set((await app.maintenance.sweep(batch_size=10, pause=0)).values()) == {0}
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("expired, batches", [(5, [2, 2, 1]), (4, [2, 2, 0]), (0, [0])])
+async def test_sweep_batches(app, db, monkeypatch, expired, batches):
+    add_revocations(app, db, *[NOW - timedelta(minutes=1)] * expired)
+
+    calls = []
+    run_batch = app.maintenance.run_batch
+
+    def record(task, limit):
+        count = run_batch(task, limit)
+        calls.append((task, limit, count))
+        return count
+
+    monkeypatch.setattr(app.maintenance, "run_batch", record)
+    report = await app.maintenance.sweep(batch_size=2, pause=0)
+
+    assert report["expired_revocations"] == expired
+    assert {limit for _, limit, _ in calls} == {2}
+    assert [count for task, _, count in calls if task is app.crud.delete_expired_revocations] == batches
+    # Every other task stops after one empty batch
+    assert len(calls) == len(report) - 1 + len(batches)
+
+@pytest.mark.anyio
+async def test_unverified_retention_disabled(app, db, register, monkeypatch):
+    assert register("carol").status_code == 201
+    set_user(app, db, "carol", created_at=NOW - timedelta(days=30))
+
+    monkeypatch.setattr(app.settings, "UNVERIFIED_ACCOUNT_RETENTION_DAYS", 0)
+    report = await app.maintenance.sweep(batch_size=10, pause=0)
+
+    assert "unverified_users" not in report
+    assert user_id(app, db, "carol")
@@ -0,0 +1,26 @@
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture
+def scrape(app):
+    """GET /metrics from the given client address"""
+
+    def scrape(host: str):
+        with TestClient(app.main.app, client=(host, 50000)) as client:
+            return client.get("/metrics")
+
+    return scrape
+
+def test_metrics_from_localhost(scrape):
+    response = scrape("127.0.0.1")
+    assert response.status_code == 200
+    assert "db_pool_connections" in response.text
+
+def test_metrics_allow_list(app, scrape, monkeypatch):
+    assert scrape("203.0.113.7").status_code == 403
+    assert scrape("testclient").status_code == 403
+
+    monkeypatch.setattr(app.settings, "METRICS_ALLOWED_IPS", ["10.0.0.0/8", "2001:db8::/32"])
+    assert scrape("10.1.2.3").status_code == 200
+    assert scrape("2001:db8::1").status_code == 200
+    assert scrape("127.0.0.1").status_code == 403
@@ -0,0 +1,70 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from conftest import PASSWORD
+
+# Schema created by the first release (create_all on startup, plaintext tokens)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    username VARCHAR NOT NULL,
+    email VARCHAR NOT NULL,
+    full_name VARCHAR,
+    id INTEGER NOT NULL,
+    hashed_password VARCHAR NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    is_verified BOOLEAN NOT NULL,
+    verification_token VARCHAR,
+    reset_token VARCHAR,
+    reset_token_expires DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_id ON users (id);
+"""
+
+def create_baseline(app, users: list[tuple]):
+    conn = sqlite3.connect(app.database.database_url.database)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO users (username, email, hashed_password, is_active, is_verified, verification_token, reset_token, reset_token_expires)"
+        " VALUES (?, ?, ?, 1, 0, ?, ?, ?)",
+        users
+    )
+    conn.commit()
+    conn.close()
+
+def test_fresh_database(client, app):
+    assert app.migrations.current_version(app.database.engine) == app.migrations.LATEST_VERSION
+    # Already current: nothing to apply
+    assert app.migrations.migrate(app.database.engine) == []
+
+def test_upgrade_baseline_database(app):
+    hashed_password = app.security.get_password_hash(PASSWORD)
+    expires = (datetime.now(timezone.utc) + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    create_baseline(app, [
+        ("old", "old@example.com", hashed_password, "old-verification-token", None, None),
+        ("reset", "reset@example.com", hashed_password, None, "old-reset-token", expires),
+    ])
+
+    with TestClient(app.main.app) as client:
+        assert app.migrations.current_version(app.database.engine) == app.migrations.LATEST_VERSION
+
+        # New columns: registering works on the upgraded schema
+        json = {"username": "new", "email": "new@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+        assert client.post("/auth/register", json=json).status_code == 201
+
+        # Tokens sent before the upgrade still work, through their digest
+        assert client.get("/auth/verify-email", params={"token": "old-verification-token"}).status_code == 200
+        json = {"token": "old-reset-token", "new_password": "password2", "confirm_password": "password2"}
+        assert client.post("/auth/reset-password", json=json).status_code == 200
+
+    conn = sqlite3.connect(app.database.database_url.database)
+    assert conn.execute("SELECT count(*) FROM users WHERE verification_token IS NOT NULL OR reset_token IS NOT NULL").fetchone() == (0,)
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(users)") if row[2]}
+    assert {"ix_users_verification_token_hash", "ix_users_reset_token_hash"} <= indexes
+    conn.close()
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from sqlmodel import Session, select
+
+@pytest.fixture
+def queued(register):
+    """Three verification emails in the outbox"""
+
+    for username in ("alice", "bob", "carol"):
+        assert register(username).status_code == 201
+
+def claim(app, worker_id: str, limit: int = 10, lease_seconds: int = 60, max_attempts: int = 5):
+    with Session(app.database.engine, expire_on_commit=False) as session:
+        return app.crud.claim_emails(session, worker_id, limit=limit, lease_seconds=lease_seconds, max_attempts=max_attempts)
+
+def finish(app, sent, failed=(), retry_seconds: int = 30, max_attempts: int = 5) -> int:
+    with Session(app.database.engine) as session:
+        return app.crud.finish_emails(session, sent, list(failed), retry_seconds=retry_seconds, max_attempts=max_attempts)
+
+def outbox(app) -> dict:
+    with Session(app.database.engine) as session:
+        return {row.recipient: row for row in session.exec(select(app.models.EmailOutbox))}
+
+def test_claim(app, queued):
+    first = claim(app, "a", limit=2)
+    assert [row.recipient for row in first] == ["alice@example.com", "bob@example.com"]
+    assert len({row.locked_by for row in first}) == 1
+
+    # Leased rows are not claimed again
+    assert [row.recipient for row in claim(app, "b")] == ["carol@example.com"]
+    assert claim(app, "c") == []
+
+    assert finish(app, first) == 0
+    assert set(outbox(app)) == {"carol@example.com"}
+
+def test_failed_email_retried_later(app, queued):
+    rows = claim(app, "a")
+    assert finish(app, rows[:2], [(rows[2], "timeout")]) == 0
+
+    row = outbox(app)["carol@example.com"]
+    assert (row.attempts, row.last_error, row.locked_by) == (1, "timeout", None)
+    assert row.payload["token"]
+    # Backing off: not claimable before its retry time
+    assert claim(app, "b") == []
+
+def test_expired_lease(app, queued):
+    slow = claim(app, "a", lease_seconds=0)
+    time.sleep(0.01)
+    again = claim(app, "b")
+    assert [row.id for row in again] == [row.id for row in slow]
+
+    # The first worker no longer owns the rows: it neither deletes nor reschedules them
+    assert finish(app, slow[:2], [(slow[2], "timeout")]) == 3
+    rows = outbox(app)
+    assert len(rows) == 3
+    assert {row.locked_by for row in rows.values()} == {again[0].locked_by}
+    assert rows["carol@example.com"].attempts == 0
+
+    assert finish(app, again) == 0
+    assert outbox(app) == {}
+
+@pytest.mark.anyio
+async def test_dead_email(app, queued, monkeypatch):
+    rows = claim(app, "a", max_attempts=2)
+    finish(app, rows[:2], [(rows[2], "refused")], retry_seconds=0, max_attempts=2)
+    time.sleep(0.01)
+    rows = claim(app, "a", max_attempts=2)
+    finish(app, [], [(rows[0], "refused")], retry_seconds=0, max_attempts=2)
+
+    dead = outbox(app)["carol@example.com"]
+    assert (dead.attempts, dead.last_error) == (2, "refused")
+    # Never sent now, so its token is not kept
+    assert "token" not in dead.payload
+    assert claim(app, "a", max_attempts=2) == []
+
+    monkeypatch.setattr(app.settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    report = await app.maintenance.sweep(batch_size=10, pause=0)
+    assert report["dead_emails"] == 1
+    assert outbox(app) == {}
+
+@pytest.mark.anyio
+async def test_drain_once(app, queued, monkeypatch):
+    async def deliver(message):
+        return message["To"] != "bob@example.com"
+
+    monkeypatch.setattr(app.email.dispatcher, "deliver", deliver)
+    assert await app.outbox.drain_once("worker") == 3
+
+    rows = outbox(app)
+    assert list(rows) == ["bob@example.com"]
+    assert rows["bob@example.com"].last_error == "SMTP send failed"
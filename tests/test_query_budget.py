@@ -0,0 +1,108 @@
+"""SQL statement budget per endpoint, in both database modes"""
+
+import pytest
+from sqlalchemy import event
+
+from conftest import PASSWORD
+
+# Endpoint -> maximum number of SQL statements (BEGIN/COMMIT not counted).
+# Authenticated endpoints are measured with the current user already cached.
+BUDGETS = {
+    "register": 2,  # user + outbox row
+    "register (replayed)": 0,  # same Idempotency-Key
+    "login": 2,  # user lookup + refresh token
+    "refresh": 3,  # token/user lookup, consume, new token
+    "me (cache miss)": 1,
+    "me (cache hit)": 0,
+    "me (not modified)": 0,
+    "update me": 1,
+    "update me (If-Match)": 2,  # locked re-read + update
+    "verify email": 2,
+    "forgot password": 2,
+    "reset password": 4,  # lookup, update, revoke refresh tokens, new refresh token
+    "change password": 3,  # current hash (not the cached user), update, revoke refresh tokens
+    "resend verification": 2,
+    "introspect": 1,  # one IN query for every user in the batch
+    "introspect (cached)": 0,
+}
+
+@pytest.fixture
+def measure(app, client):
+    """Send a request, record the SQL statements it executed under ``name``"""
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engines = app.database.all_engines()
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+
+    def measure(name: str, method: str, url: str, **kwargs):
+        statements.clear()
+        response = client.request(method, url, **kwargs)
+        assert response.status_code < 400, (name, response.status_code, response.text)
+        measure.results[name] = list(statements)
+        return response
+
+    measure.results = {}
+    yield measure
+
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+def test_query_budget(app, client, measure, last_email_token, monkeypatch):
+    monkeypatch.setattr(app.settings, "INTROSPECT_CLIENTS", {"gateway": "secret"})
+    password = {"password": PASSWORD, "password_confirm": PASSWORD}
+    register = {"json": {"username": "budget", "email": "budget@example.com", **password}, "headers": {"Idempotency-Key": "budget"}}
+    measure("register", "POST", "/auth/register", **register)
+    measure("register (replayed)", "POST", "/auth/register", **register)
+
+    tokens = measure("login", "POST", "/auth/login", data={"username": "budget", "password": PASSWORD}).json()
+    token = measure("refresh", "POST", "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    app.cache.user_cache.clear()
+    measure("me (cache miss)", "GET", "/user/me", headers=headers)
+    measure("me (cache hit)", "GET", "/user/me", headers=headers)
+    etag = measure("me (not modified)", "GET", "/user/me", headers={**headers, "If-None-Match": '"stale"'}).headers["ETag"]
+    measure("me (not modified)", "GET", "/user/me", headers={**headers, "If-None-Match": etag})
+    measure("update me", "PATCH", "/user/me", headers=headers, json={"full_name": "Budget"})
+    etag = client.get("/user/me", headers=headers).headers["ETag"]
+    measure("update me (If-Match)", "PATCH", "/user/me", headers={**headers, "If-Match": etag}, json={"full_name": "Budget 2"})
+
+    client.get("/user/me", headers=headers)  # PATCH invalidated the cached user
+    measure("resend verification", "POST", "/user/resend-verification", headers=headers)
+    measure("verify email", "GET", "/auth/verify-email", params={"token": last_email_token()})
+
+    measure("forgot password", "POST", "/auth/forgot-password", params={"user_email": "budget@example.com"})
+    measure("reset password", "POST", "/auth/reset-password", json={
+        "token": last_email_token(), "new_password": "password2", "confirm_password": "password2"
+    })
+
+    # The reset made the old tokens invalid
+    token = client.post("/auth/login", data={"username": "budget", "password": "password2"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/user/me", headers=headers)  # warm the cache again
+    measure("change password", "POST", "/user/change-password", headers=headers, json={
+        "current_password": "password2", "new_password": "password3", "confirm_password": "password3"
+    })
+
+    client.post("/auth/register", json={"username": "budget2", "email": "budget2@example.com", **password})
+    batch = [
+        client.post("/auth/login", data={"username": username, "password": secret}).json()["access_token"]
+        for username, secret in (("budget", "password3"), ("budget2", PASSWORD))
+    ]
+    batch += [token, "not-a-token"]  # outdated token version, invalid
+    measure("introspect", "POST", "/auth/introspect", json={"tokens": batch}, auth=("gateway", "secret"))
+    measure("introspect (cached)", "POST", "/auth/introspect", json={"tokens": batch}, auth=("gateway", "secret"))
+
+    over = {
+        name: measure.results[name]
+        for name, budget in BUDGETS.items() if len(measure.results[name]) > budget
+    }
+    assert not over, "\n".join(
+        f"{name}: {len(statements)} / {BUDGETS[name]}\n    " + "\n    ".join(statements)
+        for name, statements in over.items()
+    )
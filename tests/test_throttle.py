@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import PASSWORD
+
+class FakeRedis:
+    """The few Redis commands RedisBackend uses, on a dict"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires at or None)
+
+    def _get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    async def incrby(self, key, amount):
+        value = int(self._get(key) or 0) + amount
+        self.data[key] = (str(value), self.data.get(key, (None, None))[1])
+        return value
+
+    async def expire(self, key, seconds):
+        self.data[key] = (self.data[key][0], time.monotonic() + seconds)
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, px):
+        self.data[key] = (str(value), time.monotonic() + px / 1000)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(app, request):
+    if request.param == "memory":
+        return app.throttle.MemoryBackend()
+    return app.throttle.RedisBackend(FakeRedis())
+
+def test_backend_is_abstract(app):
+    class Incomplete(app.throttle.ThrottleBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.anyio
+async def test_backend_counters(backend):
+    assert await backend.incr("a", ttl=60) == 1
+    assert await backend.incr("a", ttl=60, amount=2) == 3
+    assert await backend.incr("a", ttl=60, amount=-1) == 2
+    assert await backend.get("a") == 2
+
+    await backend.set("b", 1.5, ttl=60)
+    assert await backend.get("b") == 1.5
+    await backend.delete("a", "b")
+    assert await backend.get("a") is None
+    assert await backend.get("b") is None
+
+@pytest.mark.anyio
+async def test_counters_not_below_zero(backend):
+    # Missing (or expired) key: a release does not leave -1 behind
+    assert await backend.incr("a", ttl=60, amount=-1) == 0
+    assert await backend.get("a") == 0
+    assert await backend.incr("a", ttl=60) == 1
+
+    assert await backend.incr("b", ttl=60) == 1
+    assert await backend.incr("b", ttl=60, amount=-3) == 0
+    assert await backend.get("b") == 0
+
+@pytest.mark.anyio
+async def test_release_after_reset(app, backend):
+    throttle = app.throttle.Throttle(backend, "test", limit=2, window=60, lockout=30)
+
+    counted_at = time.time()
+    await throttle.attempt("alice")
+    await throttle.reset("alice")
+    # Its counter is gone: giving the attempt back must not credit a later one
+    await throttle.release("alice", counted_at=counted_at)
+
+    for _ in range(2):
+        await throttle.attempt("alice")
+    with pytest.raises(app.exceptions.TooManyAttempts):
+        await throttle.attempt("alice")
+
+@pytest.mark.anyio
+async def test_expiry(backend):
+    # Redis expires counters to the second
+    await backend.incr("a", ttl=1)
+    await backend.set("b", 1, ttl=1)
+    await asyncio.sleep(1.1)
+    assert await backend.get("a") is None
+    assert await backend.get("b") is None
+
+@pytest.mark.anyio
+async def test_limit(app, backend):
+    throttle = app.throttle.Throttle(backend, "test", limit=3, window=60, lockout=30)
+
+    for _ in range(3):
+        await throttle.attempt("alice")
+    with pytest.raises(app.exceptions.TooManyAttempts):
+        await throttle.hit("alice")
+    # Locked now, other keys are not
+    with pytest.raises(app.exceptions.TooManyAttempts):
+        await throttle.check("Alice")
+    await throttle.attempt("bob")
+
+    await throttle.reset("alice")
+    await throttle.attempt("alice")
+
+@pytest.mark.anyio
+async def test_release(app, backend):
+    throttle = app.throttle.Throttle(backend, "test", limit=2, window=60, lockout=30)
+
+    now = time.time()
+    for _ in range(5):
+        await throttle.hit("alice", now=now)
+        await throttle.release("alice", counted_at=now)
+    await throttle.attempt("alice")
+    await throttle.attempt("alice")
+    with pytest.raises(app.exceptions.TooManyAttempts):
+        await throttle.attempt("alice")
+
+@pytest.mark.anyio
+async def test_backoff(app, backend):
+    throttle = app.throttle.Throttle(backend, "test", limit=10, window=60, lockout=30, backoff_after=1, backoff_base=5)
+
+    await throttle.attempt("alice")
+    await throttle.attempt("alice")
+    with pytest.raises(app.exceptions.TooManyAttempts) as raised:
+        await throttle.check("alice")
+    assert 0 < raised.value.retry_after <= 5
+
+@pytest.mark.anyio
+async def test_concurrent_failed_logins(app, serve, monkeypatch):
+    # Real hashing processes, so every attempt passes the lock check before any fails
+    monkeypatch.setattr(app.hashing.executor, "max_workers", 2)
+    monkeypatch.setattr(app.hashing.executor, "max_pending", 100)
+    monkeypatch.setattr(app.throttle.login_account, "limit", 3)
+    monkeypatch.setattr(app.throttle.login_account, "backoff_after", None)
+
+    async with serve() as client:
+        json = {"username": "alice", "email": "alice@example.com", "password": PASSWORD, "password_confirm": PASSWORD}
+        assert (await client.post("/auth/register", json=json)).status_code == 201
+
+        form = {"username": "alice", "password": "wrong-password"}
+        responses = await asyncio.gather(*(client.post("/auth/login", data=form) for _ in range(8)))
+        assert sorted(response.status_code for response in responses) == [401] * 3 + [429] * 5
+
+def test_successful_logins_not_counted(app, client, register, monkeypatch):
+    monkeypatch.setattr(app.throttle.login_ip, "limit", 2)
+    register("alice")
+
+    for _ in range(5):
+        assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 200
+    for _ in range(2):
+        assert client.post("/auth/login", data={"username": "alice", "password": "wrong-password"}).status_code == 401
+    assert client.post("/auth/login", data={"username": "alice", "password": PASSWORD}).status_code == 429
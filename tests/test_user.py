@@ -0,0 +1,129 @@
+import sqlite3
+
+import pytest
+
+from conftest import PASSWORD
+
+@pytest.fixture
+def write_behind_cache(app):
+    """Change a user directly in the database, as another worker would: this process's caches keep the old row"""
+
+    def write_behind_cache(statement: str, *parameters):
+        conn = sqlite3.connect(app.database.database_url.database)
+        conn.execute(statement, parameters)
+        conn.commit()
+        conn.close()
+
+    return write_behind_cache
+
+def token_version(app, username: str) -> int:
+    conn = sqlite3.connect(app.database.database_url.database)
+    version = conn.execute("SELECT token_version FROM users WHERE username = ?", (username,)).fetchone()[0]
+    conn.close()
+    return version
+
+def test_change_password_checks_current_hash(app, client, login, write_behind_cache):
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    assert client.get("/user/me", headers=headers).status_code == 200  # alice is cached now
+
+    # Changed elsewhere: the cached hash still matches PASSWORD, the row does not
+    write_behind_cache("UPDATE users SET hashed_password = ? WHERE username = 'alice'", app.security.get_password_hash("password9"))
+
+    json = {"current_password": PASSWORD, "new_password": "password2", "confirm_password": "password2"}
+    assert client.post("/user/change-password", headers=headers, json=json).status_code == 401
+
+    json = {"current_password": "password9", "new_password": "password2", "confirm_password": "password2"}
+    assert client.post("/user/change-password", headers=headers, json=json).status_code == 200
+    assert client.post("/auth/login", data={"username": "alice", "password": "password2"}).status_code == 200
+
+def test_token_version_bumped_in_database(app, client, login, write_behind_cache):
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    assert client.get("/user/me", headers=headers).status_code == 200
+
+    write_behind_cache("UPDATE users SET token_version = 5 WHERE username = 'alice'")
+    response = client.post("/auth/login", data={"username": "alice", "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    # Not cached version + 1, which would make tokens of version 1 valid again
+    assert client.patch("/user/me", headers=headers, json={"full_name": "Alice"}).status_code == 200
+    assert token_version(app, "alice") == 5
+    assert client.patch("/user/me", headers=headers, json={"username": "alice2"}).status_code == 200
+    assert token_version(app, "alice2") == 6
+
+def test_if_match_after_change_elsewhere(app, client, login, write_behind_cache):
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    stale = client.get("/user/me", headers=headers).headers["ETag"]
+
+    write_behind_cache("UPDATE users SET full_name = 'Changed elsewhere' WHERE username = 'alice'")
+    # Still the cached copy, the PATCH checks the row
+    assert client.get("/user/me", headers=headers).headers["ETag"] == stale
+    response = client.patch("/user/me", headers={**headers, "If-Match": stale}, json={"full_name": "Alice"})
+    assert response.status_code == 412
+
+    # The 412 dropped the cached copy: a new read gets the ETag the PATCH checks
+    response = client.get("/user/me", headers=headers)
+    assert response.json()["full_name"] == "Changed elsewhere"
+    etag = response.headers["ETag"]
+    assert etag != stale
+    response = client.patch("/user/me", headers={**headers, "If-Match": etag}, json={"full_name": "Alice"})
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "Alice"
+
+def test_update_me_conflict(client, login):
+    login("bob")
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+
+    response = client.patch("/user/me", headers=headers, json={"username": "bob"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already taken"
+
+    response = client.patch("/user/me", headers=headers, json={"email": "bob@example.com"})
+    assert response.status_code == 400
+    assert client.get("/user/me", headers=headers).json()["email"] == "alice@example.com"
+
+@pytest.mark.parametrize("stateless", [False, True])
+def test_old_tokens_rejected_after_password_change(app, client, login, monkeypatch, stateless):
+    monkeypatch.setattr(app.settings, "STATELESS_TOKENS", stateless)
+    old = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    assert client.get("/user/me", headers=old).status_code == 200
+
+    json = {"current_password": PASSWORD, "new_password": "password2", "confirm_password": "password2"}
+    assert client.post("/user/change-password", headers=old, json=json).status_code == 200
+
+    assert client.get("/user/me", headers=old).status_code == 401
+    assert client.patch("/user/me", headers=old, json={"full_name": "Alice"}).status_code == 401
+    json = {"current_password": "password2", "new_password": "password3", "confirm_password": "password3"}
+    assert client.post("/user/change-password", headers=old, json=json).status_code == 401
+
+    response = client.post("/auth/login", data={"username": "alice", "password": "password2"})
+    new = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/user/me", headers=new).status_code == 200
+
+def test_token_newer_than_cached_user(app, client, login, write_behind_cache):
+    old = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    assert client.get("/user/me", headers=old).status_code == 200
+
+    # Password changed through another worker: this one still caches version 0
+    write_behind_cache("UPDATE users SET token_version = token_version + 1 WHERE username = 'alice'")
+    response = client.post("/auth/login", data={"username": "alice", "password": PASSWORD})
+    new = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.get("/user/me", headers=new).status_code == 200
+    assert client.get("/user/me", headers=old).status_code == 401
+
+@pytest.mark.parametrize("stateless", [False, True])
+def test_resend_verification(app, client, login, last_email_token, monkeypatch, stateless):
+    monkeypatch.setattr(app.settings, "STATELESS_TOKENS", stateless)
+    headers = {"Authorization": f"Bearer {login('alice')['access_token']}"}
+    first = last_email_token()
+
+    assert client.post("/user/resend-verification", headers=headers).status_code == 200
+    token = last_email_token()
+    assert token != first
+    # Only the latest token verifies the email
+    assert client.get("/auth/verify-email", params={"token": first}).status_code == 404
+    assert client.get("/auth/verify-email", params={"token": token}).status_code == 200
+
+    response = client.post("/user/resend-verification", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email has been verified"